@@ -1,7 +1,8 @@
 """This module handles all API calls"""
+from asyncio import get_event_loop, new_event_loop
 from builtins import str
+from functools import partial
 from requests import HTTPError
-from requests import Session
 from urllib.parse import (urlencode,
                           urljoin,
                           urlunsplit,
@@ -9,19 +10,20 @@ from urllib.parse import (urlencode,
 
 from gobble.config import settings
 from gobble.logger import log
+from gobble.session import get_executor, get_session
 from gobble.snapshot import SnapShot, to_json
 
 
-# One session for all queries
-_session = Session()
-
-
 class EndPoint(object):
-    """An API endpoint served by the os-conductor app"""
+    """An API endpoint served by the os-conductor app
+
+    Requests go through the session shared by all endpoints and uploads
+    (see :func:`gobble.session.get_session`), unless one is given.
+    """
 
     def __init__(self, method, *path,
                  trailing_slash=False,
-                 session=_session):
+                 session=None):
 
         self.has_slash = trailing_slash
         self.method = method
@@ -31,7 +33,8 @@ class EndPoint(object):
 
     @property
     def fire(self):
-        return getattr(self._session, self.method.lower())
+        session = self._session or get_session()
+        return getattr(session, self.method.lower())
 
     @property
     def url(self):
@@ -78,6 +81,38 @@ class EndPoint(object):
         }
 
 
+class AsyncEndPoint(EndPoint):
+    """An awaitable version of an API endpoint.
+
+    The request is fired in the thread pool shared by all requests (see
+    :func:`gobble.session.get_executor`), so awaiting an endpoint never
+    blocks the loop. Snapshots are taken exactly like for the synchronous
+    version.
+    """
+
+    async def __call__(self, params=None, **request):
+        """Fire, take a snapshot and return the response (asynchronously)
+        """
+        fire = partial(super(AsyncEndPoint, self).__call__, params, **request)
+        return await get_event_loop().run_in_executor(get_executor(), fire)
+
+    def __repr__(self):
+        return '<AsyncEndPoint ' + str(self) + '>'
+
+
+def run(coroutine):
+    """Run a coroutine until it's done inside a new event loop
+
+    This is how the synchronous API wraps the asynchronous one. It must not
+    be called from inside a running event loop.
+    """
+    loop = new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
 # Expose callable endpoint objects to other modules
 # -----------------------------------------------------------------------------
 authenticate_user = EndPoint('GET', 'user', 'check')
@@ -92,6 +127,20 @@ toggle_publish = EndPoint('POST', 'package', 'publish')
 # -----------------------------------------------------------------------------
 
 
+# Expose awaitable endpoint objects to other modules
+# -----------------------------------------------------------------------------
+authenticate_user_async = AsyncEndPoint('GET', 'user', 'check')
+authorize_user_async = AsyncEndPoint('GET', 'user', 'authorize')
+oauth_callback_async = AsyncEndPoint('GET', 'oauth', 'callback')
+update_user_async = AsyncEndPoint('POST', 'user', 'update')
+search_packages_async = AsyncEndPoint('GET', 'search', 'package')
+upload_package_async = AsyncEndPoint('POST', 'package', 'upload')
+upload_status_async = AsyncEndPoint('GET', 'package', 'status')
+request_upload_async = AsyncEndPoint('POST', 'datastore', trailing_slash=True)
+toggle_publish_async = AsyncEndPoint('POST', 'package', 'publish')
+# -----------------------------------------------------------------------------
+
+
 def handle(response):
     """Handle a response and return its payload
 
@@ -0,0 +1,113 @@
+"""Upload many fiscal data-packages in one go"""
+from asyncio import Semaphore, gather
+from collections import namedtuple
+from os import walk
+from os.path import isdir, join, abspath
+from time import monotonic
+
+from gobble.api import run
+from gobble.config import settings
+from gobble.fiscal import FiscalDataPackage
+from gobble.logger import log
+from gobble.s3 import TransferScheduler
+from gobble.session import connection_stats
+from gobble.user import User
+
+
+DESCRIPTOR_FILENAME = 'datapackage.json'
+
+
+Result = namedtuple('Result', ['filepath', 'url', 'error', 'seconds'])
+Result.__doc__ = """The outcome of one package upload.
+
+Exactly one of `url` (on success) and `error` (on failure) is set.
+"""
+
+
+def find_descriptors(targets):
+    """Return the descriptors inside a list of files and folders.
+
+    Folders are searched recursively for files called `datapackage.json`.
+    """
+    descriptors = []
+
+    for target in targets:
+        if isdir(target):
+            for folder, _, files in sorted(walk(target)):
+                if DESCRIPTOR_FILENAME in files:
+                    descriptors.append(join(folder, DESCRIPTOR_FILENAME))
+        else:
+            descriptors.append(target)
+
+    return [abspath(descriptor) for descriptor in descriptors]
+
+
+async def upload_many_async(targets,
+                            user=None,
+                            publish=True,
+                            skip_validation=False,
+                            incremental=False,
+                            compress=False,
+                            error_budget=None,
+                            pipelined=False,
+                            max_packages=None,
+                            max_transfers=None,
+                            max_loads=None):
+    """Upload many fiscal data-packages concurrently.
+
+    The user is authenticated once for all packages. All packages share one
+    S3 transfer scheduler, so `max_transfers` is a global limit, and at
+    most `max_loads` packages are loading into the datastore at any time.
+    A failed package does not stop the others.
+
+    :param targets: a list of descriptors and/or folders of packages
+    :param user: a `gobble.user.User` object (created if needed)
+    :param max_packages: defaults to `settings.BATCH_MAX_PACKAGES`
+    :param max_transfers: defaults to `settings.S3_MAX_TRANSFERS`
+    :param max_loads: defaults to `settings.BATCH_MAX_LOADS`
+
+    :return: a list of :class:`Result` objects, in the order of the targets
+    """
+    user = user or User()
+    scheduler = TransferScheduler(max_transfers=max_transfers)
+    package_slots = Semaphore(max_packages or settings.BATCH_MAX_PACKAGES)
+    loading_slots = Semaphore(max_loads or settings.BATCH_MAX_LOADS)
+
+    async def upload_one(filepath):
+        async with package_slots:
+            start = monotonic()
+            try:
+                package = FiscalDataPackage(filepath,
+                                            user=user,
+                                            scheduler=scheduler)
+                url = await package.upload_async(
+                    publish=publish,
+                    skip_validation=skip_validation,
+                    incremental=incremental,
+                    compress=compress,
+                    error_budget=error_budget,
+                    pipelined=pipelined,
+                    loading_slots=loading_slots
+                )
+                return Result(filepath, url, None, monotonic() - start)
+
+            except Exception as error:
+                log.error('Failed to upload %s: %r', filepath, error)
+                return Result(filepath, None, error, monotonic() - start)
+
+    descriptors = find_descriptors(targets)
+    log.info('Uploading %s packages', len(descriptors))
+    results = await gather(*[upload_one(filepath) for filepath in descriptors])
+
+    message = '%(requests)s HTTP requests over %(connections)s connections'
+    log.info(message, connection_stats())
+    return results
+
+
+def upload_many(targets, **options):
+    """Upload many fiscal data-packages concurrently.
+
+    This is the synchronous version of :func:`upload_many_async`, which
+    takes the same arguments.
+    """
+    return run(upload_many_async(targets, **options))
@@ -0,0 +1,199 @@
+"""Keep track of expensive computations in the user folder"""
+import io
+
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
+from json import loads, dumps, JSONDecodeError
+from os import fdopen, replace, stat
+from os.path import join, abspath
+from tempfile import mkstemp
+
+from gobble.compression import describe_compressed
+from gobble.config import settings
+from gobble.logger import log
+
+
+MANIFEST_FILE = 'manifest.json'
+LEDGER_FILE = 'uploads.json'
+VALIDATION_FILE = 'validation.json'
+
+
+def compute_hash(filepath, block_size=None):
+    """Return the md5 hash of a file"""
+    hasher = md5()
+    buffer = bytearray(block_size or settings.HASHING_BLOCK_SIZE)
+    view = memoryview(buffer)
+
+    with io.open(filepath, 'rb', buffering=0) as stream:
+        size = stream.readinto(buffer)
+        while size:
+            hasher.update(view[:size])
+            size = stream.readinto(buffer)
+
+    md5_binary = hasher.digest()
+    md5_bytes = b64encode(md5_binary)
+    md5_unicode = md5_bytes.decode('utf-8')
+
+    return md5_unicode
+
+
+def compute_hashes(filepaths, function=None):
+    """Return a `dict` with the md5 hashes of several files.
+
+    The files are hashed concurrently by `settings.HASHING_WORKERS` threads.
+    Reading large blocks from disk and feeding them to the hasher both
+    release the GIL, so the threads really do run on separate cores.
+
+    :param function: the function applied to each file (`compute_hash`)
+    """
+    function = function or compute_hash
+    filepaths = list(filepaths)
+    if not filepaths:
+        return {}
+
+    workers = min(settings.HASHING_WORKERS, len(filepaths))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(filepaths, pool.map(function, filepaths)))
+
+
+class FileCache(dict):
+    """A dictionary backed by a JSON file inside the user folder.
+
+    Sub-classes only need to set the `filename` attribute. The file is read
+    once on instantiation and written atomically on every :meth:`save`, so
+    that a process killed half-way never leaves a corrupt cache behind.
+    Several instances can share the same file: top-level keys saved by the
+    others are kept.
+    """
+
+    filename = None
+
+    def __init__(self):
+        super(FileCache, self).__init__()
+        self.load()
+
+    @property
+    def filepath(self):
+        return join(settings.USER_DIR, self.filename)
+
+    def load(self):
+        """Read the cache from disk (a missing or broken file is ignored)"""
+        self.update(self._read())
+
+    def save(self):
+        """Write the cache to disk"""
+        entries = self._read()
+        entries.update(self)
+
+        handle, temporary = mkstemp(dir=settings.USER_DIR, suffix='.tmp')
+        with fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(dumps(entries, ensure_ascii=False))
+        replace(temporary, self.filepath)
+
+    def _read(self):
+        try:
+            with io.open(self.filepath, encoding='utf-8') as file:
+                return loads(file.read())
+        except (FileNotFoundError, JSONDecodeError):
+            log.debug('Starting with an empty %s', self.filename)
+            return {}
+
+
+class Manifest(FileCache):
+    """The sizes and md5 hashes of local files.
+
+    An entry is keyed by the absolute path of the file and remains valid
+    for as long as the size, modification time and inode of the file are
+    unchanged. That way, each file is hashed at most once, even across
+    separate Gobble processes. The length and md5 hash of the gzipped
+    content are added under the `gzip` key when they are first needed.
+    """
+
+    filename = MANIFEST_FILE
+
+    def describe(self, filepath, compressed=False):
+        """Return a `dict` with the length and md5 hash of a file"""
+        return self.describe_all([filepath], compressed=compressed)[0]
+
+    def describe_all(self, filepaths, compressed=False):
+        """Describe several files, hashing the new ones in parallel.
+
+        :param compressed: describe the gzipped content of the files
+        """
+        filepaths = [abspath(filepath) for filepath in filepaths]
+        stale = {}
+
+        for filepath in filepaths:
+            info = stat(filepath)
+            fingerprint = [info.st_size, info.st_mtime_ns, info.st_ino]
+            entry = self.get(filepath)
+            if not entry or entry['fingerprint'] != fingerprint:
+                stale[filepath] = fingerprint
+
+        if stale:
+            log.debug('Hashing %s new or modified files', len(stale))
+            hashes = compute_hashes(stale)
+
+            for filepath, fingerprint in stale.items():
+                self[filepath] = {
+                    'fingerprint': fingerprint,
+                    'length': fingerprint[0],
+                    'md5': hashes[filepath],
+                }
+            self.save()
+
+        if compressed:
+            self._describe_compressed(filepaths)
+            return [self[filepath]['gzip'] for filepath in filepaths]
+
+        return [self[filepath] for filepath in filepaths]
+
+    def _describe_compressed(self, filepaths):
+        missing = [filepath for filepath in filepaths
+                   if 'gzip' not in self[filepath]]
+
+        if missing:
+            log.debug('Compressing %s new or modified files', len(missing))
+            descriptions = compute_hashes(missing, describe_compressed)
+
+            for filepath, description in descriptions.items():
+                self[filepath]['gzip'] = description
+            self.save()
+
+
+class Ledger(FileCache):
+    """The md5 hashes of the files last pushed to S3, for each package.
+
+    Packages are keyed by "owner:name" and files by their relative path
+    inside the package, which is how they are stored in the S3 bucket.
+    """
+
+    filename = LEDGER_FILE
+
+    def has(self, owner, name, path, md5_hash):
+        """Was this exact file already pushed for this package?"""
+        return self.get(owner + ':' + name, {}).get(path) == md5_hash
+
+    def record(self, owner, name, md5_hashes):
+        """Remember the files pushed for a package (a path to md5 `dict`)"""
+        self.setdefault(owner + ':' + name, {}).update(md5_hashes)
+        self.save()
+
+
+class ValidationCache(FileCache):
+    """The outcomes of past validations of descriptors and data files.
+
+    Entries are keyed by a hash of everything an outcome depends on, for
+    example the version of the fiscal profile, the schema of a resource and
+    the md5 hash of its data file (see :meth:`key`). Any change to those
+    gives a new key, so a stale outcome is never used.
+    """
+
+    filename = VALIDATION_FILE
+
+    @staticmethod
+    def key(*inputs):
+        """Return the key of an outcome from its (JSON serializable) inputs"""
+        text = dumps(inputs, sort_keys=True, ensure_ascii=False)
+        return md5(text.encode('utf-8')).hexdigest()
@@ -8,10 +8,12 @@ from os.path import join, splitext, basename
 from shutil import rmtree
 
 from datapackage.exceptions import ValidationError
+from gobble.batch import upload_many as batch_upload
 from gobble.config import ROOT_DIR, settings
 from gobble.fiscal import FiscalDataPackage
 from gobble.search import search as elasticsearch, ALLOWED_KEYS
 from gobble.user import create_user, User
+from gobble.validation import ErrorBudget
 from click import (Choice,
                    command,
                    argument,
@@ -61,7 +63,10 @@ _FILES = [
     'settings',
     'token',
     'authentication',
-    'permissions'
+    'permissions',
+    'manifest',
+    'uploads',
+    'validation'
 ]
 
 
@@ -151,11 +156,35 @@ def user(action):
     help='Validate only the schema.',
     is_flag=True
 )
-def validate(filepath, schema):
+@option(
+    '--sample',
+    help='Only validate a sample of rows, drawn with this strategy.',
+    type=Choice(['stratified', 'random'])
+)
+@option(
+    '--sample-size',
+    help='Number of rows in the sample.',
+    type=int
+)
+@option(
+    '--max-bad-rows',
+    help='Stop validating a file after this many bad rows.',
+    type=int
+)
+@option(
+    '--max-column-errors',
+    help='Stop validating a file after this many errors in one column.',
+    type=int
+)
+def validate(filepath, schema, sample, sample_size,
+             max_bad_rows, max_column_errors):
     """Validate a fiscal data-package.
 
     The FILEPATH is the relative or absolute path to a datapackage. By default,
-    the command validates both the schema and the data files.
+    the command validates both the schema and the data files. For a quick
+    check of large files, pass --sample to only validate a sample of rows.
+    To give up on a file as soon as it has too many errors, set an error
+    budget with --max-bad-rows and/or --max-column-errors.
     """
     _, extension = splitext(filepath)
     filename = basename(filepath)
@@ -165,18 +194,46 @@ def validate(filepath, schema):
         sys.exit(1)
 
     package = FiscalDataPackage(filepath)
-    error_messages = package.validate(raise_on_error=False, schema_only=schema)
+    budget = _error_budget(max_bad_rows, max_column_errors)
+    error_messages = package.validate(raise_on_error=False,
+                                      schema_only=schema,
+                                      sample=sample,
+                                      sample_size=sample_size,
+                                      error_budget=budget)
 
     if error_messages:
         for error_message in error_messages:
             secho(error_message, **ERROR_STYLE)
+    elif sample and not schema:
+        size = sample_size or settings.VALIDATION_SAMPLE_SIZE
+        message = 'SUCCESS! A %s sample of %s rows of %s is valid'
+        secho(message % (sample, size, filename), **SUCCESS_STYLE)
     else:
         secho('SUCCESS! %s is valid' % filename, **SUCCESS_STYLE)
 
 
+def _error_budget(max_bad_rows, max_column_errors):
+    if max_bad_rows is None and max_column_errors is None:
+        return None
+    return ErrorBudget(max_bad_rows, max_column_errors)
+
+
 # Upload
 # -----------------------------------------------------------------------------
 
+def _echo_progress(progress):
+    message = 'Loading into the datastore (%s): %s rows' % (
+        progress.status, progress.rows
+    )
+    if progress.total_rows:
+        message += ' out of ~%s' % progress.total_rows
+    if progress.rate:
+        message += ', %.0f rows/s' % progress.rate
+    if progress.eta is not None:
+        message += ', %.0fs left' % progress.eta
+    secho(message, **DEFAULT_STYLE)
+
+
 @command(context_settings=CONTEXT_SETTINGS)
 @argument(
     'filepath',
@@ -193,13 +250,44 @@ def validate(filepath, schema):
     help='Keep the online data-package private.',
     is_flag=True
 )
-def upload(filepath, private, skip):
+@option(
+    '-i', '--incremental',
+    help='Only send files modified since the last upload.',
+    is_flag=True
+)
+@option(
+    '-z', '--compress',
+    help='Gzip data files on the way to S3.',
+    is_flag=True
+)
+@option(
+    '--pipelined',
+    help='Send each data file to S3 as soon as it has been validated.',
+    is_flag=True
+)
+@option(
+    '--max-bad-rows',
+    help='Stop validating a file after this many bad rows.',
+    type=int
+)
+@option(
+    '--max-column-errors',
+    help='Stop validating a file after this many errors in one column.',
+    type=int
+)
+def upload(filepath, private, skip, incremental, compress, pipelined,
+           max_bad_rows, max_column_errors):
     """Upload a fiscal package to Open-Spending.
 
     The FILEPATH is the relative or absolute path to the data-package file.
     The data is always validated before upload, unless validation is skipped
     explicitely. This is not recommended. Once uploaded, the data-package will
-    published, unless you pass the --private flag.
+    published, unless you pass the --private flag. To re-upload a package
+    without sending the files that have not changed, pass --incremental.
+    On a slow connection, pass --compress to gzip the data on the fly.
+    With an error budget, the data files are validated too and the upload
+    is aborted as soon as a file exceeds its budget. Pass --pipelined to
+    validate the data files while the valid ones are already being sent.
     """
 
     user_ = User()
@@ -210,7 +298,15 @@ def upload(filepath, private, skip):
     secho(message % args, **DEFAULT_STYLE)
 
     try:
-        url = package.upload(publish=not private, skip_validation=skip)
+        url = package.upload(
+            publish=not private,
+            skip_validation=skip,
+            incremental=incremental,
+            compress=compress,
+            error_budget=_error_budget(max_bad_rows, max_column_errors),
+            pipelined=pipelined,
+            callback=_echo_progress
+        )
 
         state = 'privately' if private else 'publicly'
         args = package, state, url
@@ -226,6 +322,92 @@ def upload(filepath, private, skip):
         secho(message, **ERROR_STYLE)
 
 
+@command('upload-many', context_settings=CONTEXT_SETTINGS)
+@argument(
+    'targets',
+    nargs=-1,
+    type=Path(exists=True, resolve_path=True),
+    required=True
+)
+@option(
+    '-s', '--skip',
+    help='Skip validation (not recommended).',
+    is_flag=True
+)
+@option(
+    '-p', '--private',
+    help='Keep the online data-packages private.',
+    is_flag=True
+)
+@option(
+    '-i', '--incremental',
+    help='Only send files modified since the last upload.',
+    is_flag=True
+)
+@option(
+    '-z', '--compress',
+    help='Gzip data files on the way to S3.',
+    is_flag=True
+)
+@option(
+    '--pipelined',
+    help='Send each data file to S3 as soon as it has been validated.',
+    is_flag=True
+)
+@option(
+    '--max-packages',
+    help='Maximum number of packages uploaded at once.',
+    type=int
+)
+@option(
+    '--max-transfers',
+    help='Maximum number of concurrent S3 transfers (all packages).',
+    type=int
+)
+@option(
+    '--max-loads',
+    help='Maximum number of packages loading into the datastore at once.',
+    type=int
+)
+def upload_many(targets, skip, private, incremental, compress, pipelined,
+                max_packages, max_transfers, max_loads):
+    """Upload many fiscal packages to Open-Spending.
+
+    Each of the TARGETS is either a data-package file or a folder, which is
+    searched recursively for datapackage.json files. Packages are uploaded
+    concurrently, within the limits set by the options (or the settings).
+    A summary of all uploads is displayed at the end.
+    """
+    results = batch_upload(
+        targets,
+        publish=not private,
+        skip_validation=skip,
+        incremental=incremental,
+        compress=compress,
+        pipelined=pipelined,
+        max_packages=max_packages,
+        max_transfers=max_transfers,
+        max_loads=max_loads
+    )
+
+    for result in results:
+        if result.error:
+            message = 'FAILED %s (%.1fs): %s'
+            args = result.filepath, result.seconds, result.error
+            secho(message % args, **ERROR_STYLE)
+        else:
+            message = 'OK %s (%.1fs): %s'
+            args = result.filepath, result.seconds, result.url
+            secho(message % args, **SUCCESS_STYLE)
+
+    failures = len([result for result in results if result.error])
+    summary = '%s packages uploaded, %s failed.'
+    secho(summary % (len(results) - failures, failures), **DEFAULT_STYLE)
+
+    if failures:
+        sys.exit(1)
+
+
 # Search
 # -----------------------------------------------------------------------------
 
@@ -322,6 +504,7 @@ def search(expression, where, limit, private, raw):
 
 gobble.add_command(validate)
 gobble.add_command(upload)
+gobble.add_command(upload_many)
 gobble.add_command(user)
 gobble.add_command(view)
 gobble.add_command(search)
@@ -0,0 +1,84 @@
+"""Compress files on the fly for transfer"""
+import io
+import zlib
+
+from base64 import b64encode
+from hashlib import md5
+
+from gobble.config import settings
+
+
+# A gzip container without a file name or timestamp in its header
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class GzipStream(io.RawIOBase):
+    """A read-only stream of the gzipped content of a file.
+
+    The file is compressed block by block as the stream is read, so a
+    compressed copy never exists in memory or on disk. The output is
+    deterministic: reading the same file twice gives the same bytes, which
+    is what allows the compressed size and md5 hash to be announced before
+    the body is sent.
+
+    :param filepath: the path of the local file
+    :param length: the length of the compressed stream, if known
+    """
+
+    def __init__(self, filepath, length=None):
+        super(GzipStream, self).__init__()
+        self.length = length
+        self._file = io.open(filepath, 'rb')
+        self._compressor = zlib.compressobj(settings.GZIP_LEVEL,
+                                            zlib.DEFLATED,
+                                            GZIP_WBITS)
+        self._buffer = bytearray()
+
+    def __len__(self):
+        # The HTTP client uses this as the Content-Length
+        return self.length
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            if not self._compressor:
+                break
+            block = self._file.read(settings.HASHING_BLOCK_SIZE)
+            if block:
+                self._buffer += self._compressor.compress(block)
+            else:
+                self._buffer += self._compressor.flush()
+                self._compressor = None
+
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super(GzipStream, self).close()
+
+
+def describe_compressed(filepath):
+    """Return the length and md5 hash of the gzipped content of a file"""
+    hasher = md5()
+    length = 0
+
+    with GzipStream(filepath) as stream:
+        block = stream.read(settings.HASHING_BLOCK_SIZE)
+        while block:
+            hasher.update(block)
+            length += len(block)
+            block = stream.read(settings.HASHING_BLOCK_SIZE)
+
+    md5_unicode = b64encode(hasher.digest()).decode('utf-8')
+    return {'length': length, 'md5': md5_unicode}
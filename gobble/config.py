@@ -2,6 +2,7 @@
 from logging import DEBUG
 from os import getenv
 from os import mkdir
+from os import cpu_count
 from os.path import isdir
 from os.path import join, abspath, dirname, expanduser
 from sys import modules
@@ -28,6 +29,33 @@ class Production(object):
                        '[%(funcName)s] '
                        '[%(levelname)s] '
                        '%(message)s')
+    HASHING_WORKERS = cpu_count() or 1
+    HASHING_BLOCK_SIZE = 1024 * 1024
+    VALIDATION_WORKERS = cpu_count() or 1
+    VALIDATION_CHUNK_SIZE = 8 * 1024 * 1024
+    VALIDATION_SAMPLE_SIZE = 1000
+    VALIDATION_BLOCK_ROWS = 10000
+    REPORT_MAX_PER_TYPE = 100
+    # The upload urls signed by os-conductor only allow single PUT requests
+    S3_MULTIPART_THRESHOLD = None
+    S3_PART_SIZE = 64 * 1024 * 1024
+    S3_PART_WORKERS = 4
+    S3_PART_RETRIES = 3
+    S3_MAX_TRANSFERS = 8
+    S3_MAX_INFLIGHT_BYTES = 512 * 1024 * 1024
+    GZIP_LEVEL = 6
+    # One connection pool for the conductor API and S3 transfers
+    HTTP_POOL_SIZE = 32
+    HTTP_POOL_HOSTS = 10
+    HTTP_KEEP_ALIVE = True
+    HTTP_CONNECT_TIMEOUT = 10
+    HTTP_READ_TIMEOUT = 120
+    HTTP_WORKERS = 16
+    POLL_MIN_PERIOD = 0.5
+    POLL_MAX_PERIOD = 30
+    POLL_BACKOFF = 1.5
+    BATCH_MAX_PACKAGES = 4
+    BATCH_MAX_LOADS = 2
 
 
 class Staging(Production):
@@ -36,6 +64,7 @@ class Staging(Production):
 
 class Development(Production):
     S3_BUCKET_URL = 'http://fakes3/fake-bucket'
+    S3_MULTIPART_THRESHOLD = 256 * 1024 * 1024
     OS_URL = 'http://dev.openspending.org'
     USER_DIR = join(HOME_DIR, '.gobble.dev')
     FILE_LOG_LEVEL = DEBUG
@@ -2,32 +2,40 @@
 import io
 import sys
 
-from base64 import b64encode
-from hashlib import md5
-from io import StringIO
-from os.path import getsize, join, basename, isfile
+from asyncio import get_event_loop, gather, sleep as async_sleep, wrap_future
+from functools import partial
+from os.path import join, basename, isfile
+from threading import Event
 from time import sleep
-from json import dumps, loads, JSONDecodeError
-from datapackage import DataPackage, Profile
+from json import loads, JSONDecodeError
+from datapackage import DataPackage
 from datapackage.exceptions import ValidationError
 from gobble.user import User
-from goodtables.pipeline import Pipeline
 from requests import HTTPError
-from requests_futures.sessions import FuturesSession
 
+from gobble.cache import Manifest, Ledger, ValidationCache, compute_hash
 from gobble.config import settings
+from gobble.journal import Journal
 from gobble.logger import log
+from gobble.progress import Poller, estimate_rows
+from gobble.report import ReportWriter
+from gobble.s3 import TransferScheduler
+from gobble.validation import (validate_resources,
+                               get_validator,
+                               check_model,
+                               read_header,
+                               ErrorBudgetExceeded)
 from gobble.api import (handle,
-                        upload_package,
-                        request_upload,
-                        toggle_publish,
-                        upload_status)
+                        run,
+                        upload_package_async,
+                        request_upload_async,
+                        toggle_publish_async,
+                        upload_status,
+                        upload_status_async)
 
 
-HASHING_BLOCK_SIZE = 65536
 OS_DATA_FORMATS = ['.csv']
-POLL_PERIOD = 5
-REPORT_FILENAME = 'goodtables.report.json'
+REPORT_FILENAME = 'goodtables.report.jsonl'
 
 
 class ToggleError(Exception):
@@ -38,23 +46,6 @@ class UploadError(Exception):
     pass
 
 
-def compute_hash(filepath):
-    """Return the md5 hash of a file"""
-    hasher = md5()
-
-    with io.open(filepath, 'rb') as stream:
-        chunk = stream.read(HASHING_BLOCK_SIZE)
-        while len(chunk) > 0:
-            hasher.update(chunk)
-            chunk = stream.read(HASHING_BLOCK_SIZE)
-
-    md5_binary = hasher.digest()
-    md5_bytes = b64encode(md5_binary)
-    md5_unicode = md5_bytes.decode('utf-8')
-
-    return md5_unicode
-
-
 class FiscalDataPackage(DataPackage):
     """This class represents a fiscal data package.
 
@@ -67,26 +58,34 @@ class FiscalDataPackage(DataPackage):
     or a url pointing to a descriptor (for more information please refer to the
     documentation for the :class:`datapackage.DataPackage` class.
     :param user: a `gobble.user.user` object.
+    :param scheduler: a :class:`gobble.s3.TransferScheduler` (to share one
+    between several packages)
     """
 
-    def __init__(self, filepath, user=None, **kw):
+    def __init__(self, filepath, user=None, scheduler=None, **kw):
         if not isfile(filepath):
             raise NotImplemented('%s is not a local path', filepath)
 
         super(FiscalDataPackage, self).__init__(filepath, **kw)
         self._check_file_formats()
 
-        self._streams = []
-        self._session = FuturesSession()
-        self._futures = []
+        self._scheduler = scheduler or TransferScheduler()
+        self._transfers = {}
+        self._cancelled = Event()
         self._responses = []
+        self._manifest = Manifest()
+        self._ledger = Ledger()
+        self._journal = None
+        self._validations = ValidationCache()
+        self._profile_version = None
 
         self.user = user
         self.name = self.descriptor.get('name')
         self.path = basename(filepath)
         self.filepath = filepath
 
-    def validate(self, raise_on_error=True, schema_only=True):
+    def validate(self, raise_on_error=True, schema_only=True, sample=None,
+                 sample_size=None, error_budget=None):
         """Validate a datapackage schema.
 
         By default, only the data-package schema is validated. To validate the
@@ -94,20 +93,46 @@ class FiscalDataPackage(DataPackage):
         error is found, unless the `raise_error` flag is explicitely set to
         `False`.
 
+        Outcomes are cached in the user folder, keyed by the version of the
+        fiscal profile, the descriptor or resource schema and the content of
+        the data file. Validating unchanged files again is instantaneous.
+
+        For a quick check of large data files, pass a `sample` strategy
+        (`random` or `stratified`): only the header and a sample of rows are
+        validated (see :func:`gobble.validation.sample_rows`). Sampled
+        outcomes are never cached.
+
+        With an error budget, the validation of a data file stops as soon as
+        the budget is exceeded. The report of that file is truncated and, if
+        errors are raised, an :class:`ErrorBudgetExceeded` error is raised.
+
+        Once the schema is valid, the model is checked against the header
+        of each data file (see :meth:`precheck`), before any data file is
+        validated.
+
         :param raise_on_error: raise error on failure or not (default: True)
         :param schema_only: only validate the schema (default: True)
+        :param sample: validate a sample of rows drawn with this strategy
+        :param sample_size: defaults to `settings.VALIDATION_SAMPLE_SIZE`
+        :param error_budget: a :class:`gobble.validation.ErrorBudget`
         :raise: :class:`ValidationError` if the schema is invalid
 
         :return A list of error messages or an empty list.
         """
         messages = []
-        profile = Profile('fiscal-data-package')
+        profile = get_validator()
+        self._profile_version = profile.version
+        key = ValidationCache.key(self._profile_version, self.descriptor)
 
-        if raise_on_error:
+        if key in self._validations:
+            log.info('%s (%s) was already validated', self.path, self)
+        elif raise_on_error:
             profile.validate(self.descriptor)
+            self._cache_validation(key, True)
         else:
             try:
                 profile.validate(self.descriptor)
+                self._cache_validation(key, True)
                 message = '%s (%s) is a valid fiscal data-package schema'
                 log.info(message, self.path, self)
             except ValidationError as e:
@@ -121,12 +146,61 @@ class FiscalDataPackage(DataPackage):
             messages.append('Aborting data validation due to invalid schema')
             return messages
 
+        for error in self.precheck(raise_on_error=raise_on_error):
+            message = 'MODEL ERROR in %s: %s'
+            args = self.path, error
+            messages.append(message % args)
+            log.warn(message, *args)
+
+        if messages:
+            messages.append('Aborting data validation due to invalid model')
+            return messages
+
         if not schema_only:
-            return self._validate_data(raise_on_error)
+            return self._validate_data(raise_on_error,
+                                       sample=sample,
+                                       sample_size=sample_size,
+                                       error_budget=error_budget)
         else:
             return messages
 
-    def upload(self, publish=True, skip_validation=False):
+    def precheck(self, raise_on_error=True):
+        """Check that the model and schemas match the headers of the data.
+
+        Only the first row of each data file is read, so this takes
+        milliseconds (see :func:`gobble.validation.check_model`). It runs
+        automatically as part of :meth:`validate`, and so before uploads.
+
+        :param raise_on_error: raise error on failure or not (default: True)
+        :raise: :class:`ValidationError` with one error per problem
+
+        :return: a list of error messages or an empty list
+        """
+        resources = []
+        errors = []
+
+        for resource in self:
+            path = resource.descriptor['path']
+            try:
+                header = read_header(resource.source)
+            except OSError as error:
+                errors.append('cannot read %s: %s' % (path, error))
+                continue
+            resources.append((path, header, resource.descriptor['schema']))
+
+        errors.extend(check_model(self.descriptor.get('model', {}),
+                                  resources))
+
+        if errors and raise_on_error:
+            message = 'The model of %s does not match its data (%s errors)'
+            raise ValidationError(message % (self.path, len(errors)),
+                                  errors=[ValidationError(error)
+                                          for error in errors])
+        return errors
+
+    def upload(self, publish=True, skip_validation=False, incremental=False,
+               compress=False, error_budget=None, pipelined=False,
+               callback=None):
         """Upload a fiscal datapackage to Open-Spending.
 
         It does this in 3 steps:
@@ -139,37 +213,126 @@ class FiscalDataPackage(DataPackage):
         same fiscal data package again, the previous version will be
         overwritten.
 
+        In incremental mode, files which have already been pushed to S3 with
+        the same md5 hash are not sent again. The descriptor is always sent
+        and the datastore is always reloaded.
+
+        Each step of the upload is saved in a journal (see
+        :class:`gobble.journal.Journal`). If an upload is interrupted, the
+        next upload of the same files picks up where it left off.
+
+        In compressed mode, data files are gzipped on the fly while they are
+        sent to S3 and stored with a `Content-Encoding: gzip` header. The
+        descriptor is always sent as is.
+
+        With an error budget, the data files are validated too, before any
+        transfer, and the upload is aborted as soon as the budget of a file
+        is exceeded (see :meth:`validate`).
+
+        In pipelined mode, the data files are validated one after the other
+        and each file is sent to S3 as soon as it is valid, while the next
+        one is being validated. If a file is invalid, the transfers still in
+        flight are cancelled and the data is not loaded into the datastore.
+
         For now, the only valid datafile format is CSV.
 
         :param skip_validation: use only if you have already done so
         :param publish: toggle the datapackage to "published" after upload
+        :param incremental: only push new or modified files to S3
+        :param compress: gzip data files on the way to S3
+        :param error_budget: a :class:`gobble.validation.ErrorBudget`
+        :param pipelined: validate the data files while sending them to S3
+        :param callback: called with each :class:`gobble.progress.Progress`
+            event while the data is loading into the datastore
         """
+        return run(self.upload_async(publish=publish,
+                                     skip_validation=skip_validation,
+                                     incremental=incremental,
+                                     compress=compress,
+                                     error_budget=error_budget,
+                                     pipelined=pipelined,
+                                     callback=callback))
+
+    async def upload_async(self, publish=True, skip_validation=False,
+                           incremental=False, compress=False,
+                           error_budget=None, pipelined=False, callback=None,
+                           loading_slots=None):
+        """Upload a fiscal datapackage without blocking the event loop.
+
+        This coroutine does exactly what :meth:`upload` does and takes the
+        same arguments. HTTP requests, hashing and validation all run in the
+        loop's executor, so many packages can be uploaded concurrently.
+
+        :param loading_slots: an :class:`asyncio.Semaphore` shared between
+            uploads to limit how many packages load into the datastore at once
+        """
+        loop = get_event_loop()
+
         self.descriptor['author'] = self.user.name
         self.descriptor['owner'] = self.user.id
 
         with io.open(self.filepath, 'w') as descriptor:
             descriptor.write(self.to_json())
 
+        pipelined = pipelined and not skip_validation
         if not skip_validation:
-            self.validate()
+            validate = partial(self.validate,
+                               schema_only=pipelined or error_budget is None,
+                               error_budget=error_budget)
+            await loop.run_in_executor(None, validate)
 
         log.info('Starting uploading process for %s', self)
+        self._transfers = {}
+        self._cancelled = Event()
+        self._journal = Journal(self.user.id, self.name)
 
-        for s3_target in self._request_s3_upload():
-            self._push_to_s3(*s3_target)
+        s3_targets = await self._request_s3_upload(incremental, compress)
+        if pipelined:
+            await self._push_while_validating(s3_targets, error_budget)
+        else:
+            for s3_target in s3_targets:
+                self._push_to_s3(*s3_target)
 
-        self._handle_promises()
-        self._insert_into_datastore()
+        await self._handle_promises()
+        if not self._journal.has_reached('pushed'):
+            self._journal.advance('pushed')
 
-        sleep(POLL_PERIOD)
-        while self.in_progress:
-            sleep(POLL_PERIOD)
+        pushed = self._journal['pushed']
+        self._ledger.record(self.user.id, self.name, pushed)
+
+        if loading_slots:
+            async with loading_slots:
+                await self._load_into_datastore(callback)
+        else:
+            await self._load_into_datastore(callback)
 
         if publish:
-            self.toggle('public')
+            await self.toggle_async('public')
 
+        self._journal.close()
         return self.url
 
+    async def _load_into_datastore(self, callback):
+        if self._journal.has_reached('loaded'):
+            return
+
+        if self._journal.has_reached('inserted'):
+            log.info('Reattaching to the datastore load of %s', self)
+        else:
+            await self._insert_into_datastore()
+            self._journal.advance('inserted')
+
+        try:
+            async for progress in self.poll_async():
+                if callback:
+                    callback(progress)
+        except UploadError:
+            # The next attempt must trigger a new load
+            self._journal.advance('pushed')
+            raise
+
+        self._journal.advance('loaded')
+
     @property
     def url(self):
         return join(settings.OS_URL, self.user.id + ':' + self.name)
@@ -178,17 +341,76 @@ class FiscalDataPackage(DataPackage):
     def in_progress(self):
         """Return true when the upload finished."""
 
+        answer = self._request_status()
+        if answer is None:
+            return True
+        return answer['status'] not in {'done', 'fail'}
+
+    @property
+    def rows(self):
+        """The estimated number of rows across all data files."""
+        return sum(estimate_rows(resource.source) for resource in self)
+
+    def poll(self):
+        """Follow the datastore load until it's done.
+
+        The status endpoint is polled often at first, then less and less
+        often (see the `POLL_*` settings). Each answer is yielded as a
+        :class:`gobble.progress.Progress` event, with the loading rate and
+        the estimated time remaining.
+
+        :raise: :class:`UploadError` if the load fails
+        """
+        poller = Poller(total_rows=self.rows)
+
+        while True:
+            sleep(poller.next_delay())
+            answer = self._request_status()
+            if answer is None:
+                continue
+
+            progress = poller.progress(answer)
+            yield progress
+
+            if progress.status == 'done':
+                return
+
+    async def poll_async(self):
+        """Follow the datastore load like :meth:`poll`, asynchronously."""
+        loop = get_event_loop()
+        total_rows = await loop.run_in_executor(None, lambda: self.rows)
+        poller = Poller(total_rows=total_rows)
+
+        while True:
+            await async_sleep(poller.next_delay())
+            query = dict(datapackage=self._descriptor_s3_url)
+            response = await upload_status_async(params=query)
+            answer = self._parse_status(response)
+            if answer is None:
+                continue
+
+            progress = poller.progress(answer)
+            yield progress
+
+            if progress.status == 'done':
+                return
+
+    def _request_status(self):
+        """Return the status of the datastore load (or None if unknown)."""
         query = dict(datapackage=self._descriptor_s3_url)
+        return self._parse_status(upload_status(params=query))
+
+    def _parse_status(self, response):
         try:
-            answer = loads(upload_status(params=query).text)
+            answer = loads(response.text)
         except JSONDecodeError:
-            return True
+            return None
         args = self, answer['status'], answer['progress'], len(self)
         log.debug('%s is loading (%s) %s/%s', *args)
         if answer['status'] == 'fail':
             raise UploadError(answer.get('error'))
 
-        return answer['status'] not in {'done', 'fail'}
+        return answer
 
     def toggle(self, to_state):
         """Toggle public access to a fiscal datapackage
@@ -200,6 +422,10 @@ class FiscalDataPackage(DataPackage):
         :param to_state: the unique name of the datapackage
         :return: the new state of the package, i.e. "public" or "private"
         """
+        return run(self.toggle_async(to_state))
+
+    async def toggle_async(self, to_state):
+        """Toggle public access to a fiscal datapackage asynchronously."""
         publish = True if to_state == 'public' else False
         package_id = self.user.id + ':' + self.name
         query = dict(
@@ -207,7 +433,7 @@ class FiscalDataPackage(DataPackage):
             id=package_id,
             publish=publish
         )
-        answer = handle(toggle_publish(params=query))
+        answer = handle(await toggle_publish_async(params=query))
 
         if not answer['success']:
             message = 'Unable to toggle datapackage to %s'
@@ -219,64 +445,153 @@ class FiscalDataPackage(DataPackage):
     def _check_file_formats(self):
         pass
 
-    def _validate_data(self, raise_on_error):
-        """Validate the package resources with GoodTables."""
+    def _cache_validation(self, key, outcome):
+        self._validations[key] = outcome
+        self._validations.save()
+
+    def _validate_data(self, raise_on_error, sample=None, sample_size=None,
+                       error_budget=None, resources=None):
+        """Validate all the package resources with GoodTables.
+
+        Resources are validated in parallel (see
+        :func:`gobble.validation.validate_resources`) and their reports are
+        merged into a single report file.
+
+        :param resources: only validate these resources
+        """
+        resources = resources or list(self)
+        paths = [resource.descriptor['path'] for resource in resources]
+
+        if sample:
+            targets = [(resource.source, resource.descriptor['schema'])
+                       for resource in resources]
+            outcomes = validate_resources(targets,
+                                          sample=sample,
+                                          sample_size=sample_size,
+                                          budget=error_budget)
+            return self._report_data_errors(dict(zip(paths, outcomes)),
+                                            raise_on_error)
+
+        sources = [resource.source for resource in resources]
+        entries = self._manifest.describe_all(sources)
+        keys = {
+            resource.descriptor['path']: ValidationCache.key(
+                self._profile_version,
+                resource.descriptor['schema'],
+                entry['md5']
+            ) for resource, entry in zip(resources, entries)
+        }
+
+        outcomes = {path: self._validations[keys[path]]
+                    for path in paths if keys[path] in self._validations}
+        pending = [resource for resource in resources
+                   if resource.descriptor['path'] not in outcomes]
+        log.debug('%s data files were already validated', len(outcomes))
+
+        if pending:
+            targets = [(resource.source, resource.descriptor['schema'])
+                       for resource in pending]
+            fresh = validate_resources(targets, budget=error_budget)
+            for resource, outcome in zip(pending, fresh):
+                path = resource.descriptor['path']
+                outcomes[path] = outcome
+                if not outcome[1]['meta'].get('truncated'):
+                    self._validations[keys[path]] = outcome
+            self._validations.save()
+
+        outcomes = {path: outcomes[path] for path in paths}
+        return self._report_data_errors(outcomes, raise_on_error)
 
-        def summarize(feedback_, path_):
-            intro = 'GoodTables has detected some errors in %s.' % path_
+    @staticmethod
+    def _report_data_errors(outcomes, raise_on_error):
+        """Raise or summarize the errors in the reports of each resource.
+
+        The reports are written to a JSON Lines file (see
+        :class:`gobble.report.ReportWriter`) and the summary of each invalid
+        resource is computed from the counts kept by the writer.
+        """
+
+        def summarize(tally):
+            intro = 'GoodTables has detected some errors in %s.' % tally.path
             hint = 'Please check out the full report: %s.' % REPORT_FILENAME
 
-            info = feedback_['meta']
+            if tally.flags.get('sampled'):
+                intro += ' These errors were found in a %s sample of %s rows.'
+                intro %= (tally.flags['sample_strategy'],
+                          tally.flags['sample_size'])
+            if tally.flags.get('truncated'):
+                intro += ' Validation stopped early: too many errors.'
+
             summary = (
                 'There are {bad_rows} (out of {total_rows}) bad rows '
                 'and {bad_cols} (out of {total_cols}) bad columns. '
             ).format(
-                bad_rows=info['bad_row_count'],
-                total_rows=info['row_count'],
-                bad_cols=info['bad_column_count'],
-                total_cols=len(info['columns'])
+                bad_rows=tally.bad_row_count,
+                total_rows=tally.row_count,
+                bad_cols=tally.bad_column_count,
+                total_cols=tally.column_count
             )
+            if tally.omitted:
+                summary += '%s more errors are only counted in the report. '
+                summary %= sum(tally.omitted.values())
 
             log.debug(intro + summary)
             return [intro, summary, hint]
 
-        for resource in self:
-            schema = resource.descriptor['schema']
-            path = resource.descriptor['path']
-            filepath = join(self._base_path, path)
+        invalid = [path for path, (valid, _) in outcomes.items() if not valid]
+        if not invalid:
+            return []
 
-            pipeline = Pipeline(filepath, report_stream=StringIO())
-            pipeline.register_processor('schema', options={'schema': schema})
-            is_valid, report = pipeline.run()
+        if raise_on_error:
+            truncated = [path for path in invalid
+                         if outcomes[path][1]['meta'].get('truncated')]
+            if truncated:
+                message = '%s exceeded the error budget'
+                raise ErrorBudgetExceeded(message % ', '.join(truncated))
+            raise ValidationError('%s is invalid' % ', '.join(invalid))
 
-            if is_valid:
-                return []
+        with ReportWriter(REPORT_FILENAME) as writer:
+            for path, (valid, report) in outcomes.items():
+                writer.write(path, valid, report)
 
-            if raise_on_error:
-                raise ValidationError('%s is invalid' % filepath)
-            else:
-                feedback = report.generate()
-                with open(REPORT_FILENAME, 'w+') as json:
-                    json.write(dumps(feedback, indent=4, ensure_ascii=False))
-                return summarize(feedback, path)
+        messages = []
+        for path in invalid:
+            messages.extend(summarize(writer.tallies[path]))
+        return messages
 
     @property
     def filedata(self):
+        return self._describe_files()
+
+    def _describe_files(self, compress=False):
+        sources = [resource.source for resource in self]
+        self._manifest.describe_all(sources + [self.filepath])
+        if compress:
+            self._manifest.describe_all(sources, compressed=True)
+
+        def describe(filepath, name, type_, compressed=False):
+            entry = self._manifest.describe(filepath, compressed=compressed)
+            return {
+                'name': name,
+                'length': entry['length'],
+                'md5': entry['md5'],
+                'type': type_,
+            }
+
         filedata = {
-            resource.descriptor['path']: {
-                'name': resource.descriptor['name'],
-                'length': getsize(resource.source),
-                'md5': compute_hash(resource.source),
-                'type': resource.descriptor.get('mediatype', 'text/'+resource.descriptor['path'].split('.')[-1]),
-            } for resource in self
+            resource.descriptor['path']: describe(
+                resource.source,
+                resource.descriptor['name'],
+                resource.descriptor.get('mediatype', 'text/'+resource.descriptor['path'].split('.')[-1]),
+                compress,
+            ) for resource in self
         }
         descriptor_file = {
-            basename(self.filepath): {
-                'name': self.name,
-                'length': getsize(self.filepath),
-                'md5': compute_hash(self.filepath),
-                'type': 'application/octet-stream',
-            }
+            basename(self.filepath): describe(
+                self.filepath,
+                self.name,
+                'application/octet-stream',
+            )
         }
         filedata.update(descriptor_file)
         return {
@@ -292,33 +607,77 @@ class FiscalDataPackage(DataPackage):
         return sum([file['length']
                     for file in self.filedata['filedata'].values()])
 
-    def _get_header(self, path, content_type):
-        filepath = join(self.base_path, path)
-        return {'Content-Length': str(getsize(filepath)),
-                'Content-MD5': compute_hash(filepath),
-                'Content-Type': content_type}
+    def _get_header(self, path, content_type, compress=False):
+        compressed = compress and path != self.path
+        entry = self._manifest.describe(join(self.base_path, path),
+                                        compressed=compressed)
+        headers = {'Content-Length': str(entry['length']),
+                   'Content-MD5': entry['md5'],
+                   'Content-Type': content_type}
+        if compressed:
+            headers['Content-Encoding'] = 'gzip'
+        return headers
 
     @property
     def _descriptor_s3_url(self):
         return join(settings.S3_BUCKET_URL, self.user.id, self.name, self.path)
 
-    def _request_s3_upload(self):
-        """Request AWS S3 upload urls for all files.
+    async def _request_s3_upload(self, incremental=False, compress=False):
+        """Request AWS S3 upload urls for all (or only modified) files.
+
+        :return: a list of (url, path, query, headers) tuples
         """
-        response = request_upload(
+        loop = get_event_loop()
+        filedata = await loop.run_in_executor(None, self._prepare_filedata,
+                                              incremental, compress)
+        if not filedata['filedata']:
+            return []
+
+        response = await request_upload_async(
             params=dict(jwt=self.user.permissions['os.datastore']['token']),
-            json=self.filedata
+            json=filedata
         )
         files = handle(response)['filedata']
 
+        s3_targets = []
         for path, info in files.items():
             message = '%s is ready for upload to %s'
             log.info(message, path, info['upload_url'])
             query = {k: v[0] for k, v in info['upload_query'].items()}
-            yield (info['upload_url'],
-                   path,
-                   query,
-                   self._get_header(path, info['type']))
+            s3_targets.append((info['upload_url'],
+                               path,
+                               query,
+                               self._get_header(path, info['type'],
+                                                compress)))
+        return s3_targets
+
+    def _prepare_filedata(self, incremental=False, compress=False):
+        """Hash the files and return the payload of an upload request.
+
+        Files pushed before the upload was interrupted and, in incremental
+        mode, files unchanged since the last upload are left out.
+        """
+        filedata = self._describe_files(compress)
+        self._journal.begin(filedata['filedata'])
+
+        if self._journal.has_reached('pushed'):
+            filedata['filedata'].clear()
+        if incremental:
+            self._skip_unchanged_files(filedata['filedata'])
+        for path in self._journal['pushed']:
+            filedata['filedata'].pop(path, None)
+
+        return filedata
+
+    def _skip_unchanged_files(self, filedata):
+        """Remove the files already pushed to S3 from the filedata.
+        """
+        for path, info in list(filedata.items()):
+            if path == self.path:
+                continue
+            if self._ledger.has(self.user.id, self.name, path, info['md5']):
+                log.info('Skipping %s (unchanged since last upload)', path)
+                del filedata[path]
 
     def _push_to_s3(self, url, path, query, headers):
         """Send data files for upload to the S3 bucket.
@@ -329,29 +688,55 @@ class FiscalDataPackage(DataPackage):
         log.debug('Query parameters: %s', query)
 
         absolute_path = join(self.base_path, path)
-        stream = io.open(absolute_path, mode='rb')
-        future = self._session.put(url,
-                                   headers=headers,
-                                   data=stream,
-                                   params=query,
-                                   background_callback=self._s3_callback)
-
-        self._streams.append(stream)
-        self._futures.append(future)
-
-    @staticmethod
-    def _s3_callback(_, response):
-        handle(response)
-        log.info('Successful S3 upload: %s', response.url)
+        future = self._scheduler.submit(url, absolute_path, query, headers,
+                                        cancelled=self._cancelled)
+        self._transfers[path] = future
+
+    async def _push_while_validating(self, s3_targets, error_budget=None):
+        """Push each file to S3 as soon as it has been validated.
+
+        The descriptor, which is already valid, is pushed first. Data files
+        are validated one by one, so that the validation of each file runs
+        while the previous ones are being sent. If a file is invalid, all
+        transfers are cancelled, including those in flight, and the
+        validation error is raised once they have all stopped.
+        """
+        loop = get_event_loop()
+        s3_targets = {s3_target[1]: s3_target for s3_target in s3_targets}
+        if self.path in s3_targets:
+            self._push_to_s3(*s3_targets.pop(self.path))
 
-    def _handle_promises(self):
+        try:
+            for resource in self:
+                validate = partial(self._validate_data, True,
+                                   error_budget=error_budget,
+                                   resources=[resource])
+                await loop.run_in_executor(None, validate)
+
+                s3_target = s3_targets.pop(resource.descriptor['path'], None)
+                if s3_target:
+                    self._push_to_s3(*s3_target)
+
+        except ValidationError:
+            log.warning('Cancelling the transfers of %s', self)
+            self._cancel_transfers()
+            await gather(*map(wrap_future, self._transfers.values()),
+                         return_exceptions=True)
+            raise
+
+    def _cancel_transfers(self):
+        self._cancelled.set()
+        for future in self._transfers.values():
+            future.cancel()
+
+    async def _handle_promises(self):
         """Collect all promises from S3 uploads.
+
+        Each transfer is recorded in the journal as soon as it succeeds. If
+        one transfer fails, the others are cancelled.
         """
-        for stream, future in zip(self._streams, self._futures):
-            exception = future.exception()
-            if exception:
-                raise exception
-            response = future.result()
+        async def collect(path, future):
+            response = await wrap_future(future)
 
             if response.status_code != 200:
                 message = 'Something went wrong uploading %s to S3: %s'
@@ -359,9 +744,16 @@ class FiscalDataPackage(DataPackage):
                 raise HTTPError(message)
 
             self._responses.append(response)
-            stream.close()
+            self._journal.record_push(path)
+
+        try:
+            await gather(*[collect(path, future)
+                           for path, future in self._transfers.items()])
+        except Exception:
+            self._cancel_transfers()
+            raise
 
-    def _insert_into_datastore(self):
+    async def _insert_into_datastore(self):
         """Transfer datafiles from S3 into the postgres datastore.
 
         :return: the url of the fiscal datapackage on Open-Spending
@@ -370,7 +762,7 @@ class FiscalDataPackage(DataPackage):
             'jwt': self.user.permissions['os.datastore']['token'],
             'datapackage': self._descriptor_s3_url
         }
-        response = upload_package(params=query)
+        response = await upload_package_async(params=query)
         handle(response)
 
         log.info('Congratuations, %s was uploaded successfully!', self)
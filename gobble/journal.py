@@ -0,0 +1,60 @@
+"""Keep a journal of each upload so that it can be resumed"""
+from os import remove
+
+from gobble.cache import FileCache
+from gobble.logger import log
+
+
+PHASES = ['pushing', 'pushed', 'inserted', 'loaded']
+
+
+class Journal(FileCache):
+    """The progress of the upload of one package.
+
+    The journal is saved in the user folder after every durable step: each
+    file transfer to S3, the end of the transfers, the insertion into the
+    datastore and the end of the load. If an upload is interrupted, the
+    next upload of the same package resumes from the last saved step,
+    provided that none of the files has changed in the meantime. The
+    journal is deleted once the upload is complete.
+
+    :param owner: the id of the package owner
+    :param name: the name of the package
+    """
+
+    def __init__(self, owner, name):
+        self.filename = 'journal.%s.%s.json' % (owner, name)
+        super(Journal, self).__init__()
+
+    def begin(self, filedata):
+        """Resume the journal if the files are unchanged, or start afresh"""
+        md5_hashes = {path: info['md5'] for path, info in filedata.items()}
+
+        if self.get('md5') == md5_hashes:
+            args = self['phase'], len(self['pushed']), len(md5_hashes)
+            log.info('Resuming upload at "%s" (%s/%s files pushed)', *args)
+        else:
+            self.clear()
+            self.update(md5=md5_hashes, phase=PHASES[0], pushed={})
+            self.save()
+
+    def has_reached(self, phase):
+        return PHASES.index(self['phase']) >= PHASES.index(phase)
+
+    def record_push(self, path):
+        """Save the fact that a file is now stored on S3"""
+        self['pushed'][path] = self['md5'][path]
+        self.save()
+
+    def advance(self, phase):
+        """Save the new phase of the upload"""
+        self['phase'] = phase
+        self.save()
+
+    def close(self):
+        """Delete the journal because the upload is complete"""
+        self.clear()
+        try:
+            remove(self.filepath)
+        except FileNotFoundError:
+            pass
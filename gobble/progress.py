@@ -0,0 +1,80 @@
+"""Follow the progress of a package loading into the datastore"""
+import io
+
+from collections import namedtuple
+from os.path import getsize
+from time import monotonic
+
+from gobble.config import settings
+
+
+SAMPLE_SIZE = 65536
+
+
+Progress = namedtuple('Progress', [
+    'status',
+    'rows',
+    'total_rows',
+    'rate',
+    'eta',
+    'elapsed',
+])
+Progress.__doc__ = """A snapshot of the datastore load.
+
+The `rows` and `status` come straight from the `upload_status` endpoint.
+The `rate` is in rows per second and the `eta` in seconds: both are `None`
+until they can be computed.
+"""
+
+
+def estimate_rows(filepath):
+    """Estimate the number of rows in a CSV file without reading all of it"""
+    length = getsize(filepath)
+
+    with io.open(filepath, 'rb') as stream:
+        sample = stream.read(SAMPLE_SIZE)
+
+    if not sample:
+        return 0
+    if len(sample) == length:
+        return max(sample.count(b'\n') - 1, 0)
+
+    lines = max(sample.count(b'\n'), 1)
+    return int(length * lines / len(sample)) - 1
+
+
+class Poller(object):
+    """Decide when to poll next and turn status answers into progress.
+
+    Polling starts fast, at `settings.POLL_MIN_PERIOD` seconds, then backs
+    off exponentially by a factor of `settings.POLL_BACKOFF` until it
+    reaches `settings.POLL_MAX_PERIOD`.
+
+    :param total_rows: the (estimated) number of rows in the package
+    """
+
+    def __init__(self, total_rows=None):
+        self.total_rows = total_rows
+        self.delay = settings.POLL_MIN_PERIOD
+        self.start = monotonic()
+
+    def next_delay(self):
+        """Return the number of seconds to wait before the next poll"""
+        delay = self.delay
+        self.delay = min(self.delay * settings.POLL_BACKOFF,
+                         settings.POLL_MAX_PERIOD)
+        return delay
+
+    def progress(self, answer):
+        """Return a :class:`Progress` event for an `upload_status` answer"""
+        elapsed = monotonic() - self.start
+        rows = answer.get('progress') or 0
+        rate, eta = None, None
+
+        if rows and elapsed:
+            rate = rows / elapsed
+            if self.total_rows:
+                eta = max(self.total_rows - rows, 0) / rate
+
+        return Progress(answer['status'], rows, self.total_rows,
+                        rate, eta, elapsed)
@@ -0,0 +1,108 @@
+"""Write validation reports to disk one line at a time"""
+import io
+
+from collections import Counter
+from json import dumps
+
+from gobble.config import settings
+
+
+class Tally(object):
+    """The running counts of the validation report of one data file.
+
+    :param path: the path of the data file inside the package
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.valid = True
+        self.row_count = 0
+        self.bad_row_count = 0
+        self.bad_column_count = 0
+        self.column_count = 0
+        self.errors = Counter()
+        self.omitted = Counter()
+        self.flags = {}
+
+    def __repr__(self):
+        args = self.path, self.bad_row_count, self.row_count
+        return '<Tally %s: %s bad rows out of %s>' % args
+
+    def count(self, valid, meta):
+        """Add the `meta` statistics of a (chunk) report"""
+        self.valid = self.valid and valid
+        self.row_count += meta.get('row_count', 0)
+        self.bad_row_count += meta.get('bad_row_count', 0)
+        self.bad_column_count = max(self.bad_column_count,
+                                    meta.get('bad_column_count', 0))
+        self.column_count = max(self.column_count,
+                                len(meta.get('columns', [])))
+        for flag in ('sampled', 'sample_strategy', 'sample_size',
+                     'truncated'):
+            if flag in meta:
+                self.flags[flag] = meta[flag]
+
+    def as_dict(self):
+        return dict(self.flags,
+                    type='summary',
+                    path=self.path,
+                    valid=self.valid,
+                    row_count=self.row_count,
+                    bad_row_count=self.bad_row_count,
+                    bad_column_count=self.bad_column_count,
+                    column_count=self.column_count,
+                    errors=dict(self.errors),
+                    omitted=dict(self.omitted))
+
+
+class ReportWriter(object):
+    """A validation report streamed to a JSON Lines file.
+
+    Each result is written on its own line, tagged with the path of its
+    data file, as soon as it is given to :meth:`write`. Only the first
+    `max_per_type` results of each type (`result_id`) are written for each
+    file: the others are only counted. When the writer is closed, a summary
+    line is added for each file. Nothing but the counts is kept in memory.
+
+    Use it as a context manager::
+
+        with ReportWriter('report.jsonl') as writer:
+            writer.write('data.csv', valid, report)
+
+    :param filepath: the path of the report file
+    :param max_per_type: defaults to `settings.REPORT_MAX_PER_TYPE`
+    """
+
+    def __init__(self, filepath, max_per_type=None):
+        self.filepath = filepath
+        self.max_per_type = max_per_type or settings.REPORT_MAX_PER_TYPE
+        self.tallies = {}
+        self._file = None
+
+    def __enter__(self):
+        self._file = io.open(self.filepath, 'w', encoding='utf-8')
+        return self
+
+    def __exit__(self, *exception):
+        for tally in self.tallies.values():
+            self._write_line(tally.as_dict())
+        self._file.close()
+
+    def write(self, path, valid, report):
+        """Write the results of a report and return its :class:`Tally`"""
+        tally = self.tallies.setdefault(path, Tally(path))
+        tally.count(valid, report['meta'])
+
+        for result in report['results']:
+            kind = result['result_id']
+            tally.errors[kind] += 1
+            if tally.errors[kind] > self.max_per_type:
+                tally.omitted[kind] += 1
+            else:
+                self._write_line(dict(result, type='result', path=path))
+
+        return tally
+
+    def _write_line(self, entry):
+        self._file.write(dumps(entry, ensure_ascii=False))
+        self._file.write('\n')
@@ -0,0 +1,275 @@
+"""Transfer files to the S3 bucket"""
+import io
+
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from hashlib import md5
+from threading import Condition
+from time import sleep
+from xml.etree import ElementTree
+
+from requests import HTTPError
+
+from gobble.compression import GzipStream
+from gobble.config import settings
+from gobble.logger import log
+from gobble.session import get_session
+
+
+class TransferCancelled(Exception):
+    pass
+
+
+def needs_multipart(length):
+    """Return true if a file is large enough to be sent in several parts"""
+    threshold = settings.S3_MULTIPART_THRESHOLD
+    return threshold is not None and length > threshold
+
+
+def _find(xml, tag):
+    """Return the text of the first XML element with that (local) tag"""
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError:
+        return None
+
+    for element in root.iter():
+        if element.tag.split('}')[-1] == tag:
+            return element.text
+
+
+class CancellableStream(io.RawIOBase):
+    """A file being sent to S3, which stops the transfer once cancelled.
+
+    :param stream: the open file (or :class:`GzipStream`)
+    :param length: the number of bytes in the stream
+    :param cancelled: a :class:`threading.Event`
+    """
+
+    def __init__(self, stream, length, cancelled):
+        super(CancellableStream, self).__init__()
+        self.length = length
+        self.cancelled = cancelled
+        self._stream = stream
+
+    def __len__(self):
+        # The HTTP client uses this as the Content-Length
+        return self.length
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if self.cancelled.is_set():
+            raise TransferCancelled('Cancelled while sending')
+        return self._stream.read(size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._stream.close()
+        super(CancellableStream, self).close()
+
+
+class MultipartUpload(object):
+    """A multipart upload of a local file to an S3 object.
+
+    The file is split into parts of `settings.S3_PART_SIZE` bytes, which are
+    uploaded concurrently by `settings.S3_PART_WORKERS` threads, each with its
+    own `Content-MD5` header. A part that fails is retried on its own, up to
+    `settings.S3_PART_RETRIES` times, before the whole upload is aborted.
+
+    Calling the object runs the upload and returns the response of the final
+    "complete multipart upload" request.
+
+    :param url: the url of the S3 object
+    :param filepath: the absolute path of the local file
+    :param query: the query parameters sent with every request
+    :param headers: the headers of the equivalent single PUT request
+    :param cancelled: a :class:`threading.Event` which stops the upload
+    """
+
+    def __init__(self, url, filepath, query, headers, session=None,
+                 cancelled=None):
+        self.url = url
+        self.filepath = filepath
+        self.query = query
+        self.headers = headers
+        self.length = int(headers['Content-Length'])
+        self.upload_id = None
+        self.cancelled = cancelled
+        self._session = session or get_session()
+
+    @property
+    def parts(self):
+        """A list of (part number, offset, size) tuples"""
+        size = settings.S3_PART_SIZE
+        offsets = range(0, self.length, size)
+        return [(number, offset, min(size, self.length - offset))
+                for number, offset in enumerate(offsets, start=1)]
+
+    def __call__(self):
+        self._initiate()
+
+        try:
+            workers = min(settings.S3_PART_WORKERS, len(self.parts))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                etags = list(pool.map(self._upload_part, self.parts))
+            return self._complete(etags)
+
+        except Exception:
+            self._abort()
+            raise
+
+    def _initiate(self):
+        headers = {key: value for key, value in self.headers.items()
+                   if key not in ('Content-Length', 'Content-MD5')}
+        params = dict(self.query, uploads='')
+        response = self._session.post(self.url, params=params, headers=headers)
+        response.raise_for_status()
+
+        self.upload_id = _find(response.content, 'UploadId')
+        args = self.filepath, len(self.parts), self.upload_id
+        log.debug('Started multipart upload of %s (%s parts): %s', *args)
+
+    def _upload_part(self, part):
+        number, offset, size = part
+        if self.cancelled and self.cancelled.is_set():
+            raise TransferCancelled('Cancelled before part %s' % number)
+
+        with io.open(self.filepath, 'rb') as stream:
+            stream.seek(offset)
+            data = stream.read(size)
+
+        headers = {
+            'Content-Length': str(size),
+            'Content-MD5': b64encode(md5(data).digest()).decode('utf-8'),
+        }
+        params = dict(self.query, partNumber=number, uploadId=self.upload_id)
+
+        for attempt in range(settings.S3_PART_RETRIES + 1):
+            try:
+                response = self._session.put(self.url,
+                                             params=params,
+                                             headers=headers,
+                                             data=data)
+                response.raise_for_status()
+                log.debug('Uploaded part %s of %s', number, self.filepath)
+                return response.headers['ETag']
+
+            except (HTTPError, IOError) as error:
+                if attempt == settings.S3_PART_RETRIES:
+                    raise
+                args = number, self.filepath, error
+                log.warning('Retrying part %s of %s (%s)', *args)
+                sleep(2 ** attempt * 0.1)
+
+    def _complete(self, etags):
+        template = '<Part><PartNumber>%s</PartNumber><ETag>%s</ETag></Part>'
+        parts = ''.join(template % (number, etag)
+                        for number, etag in enumerate(etags, start=1))
+        body = '<CompleteMultipartUpload>%s</CompleteMultipartUpload>' % parts
+
+        params = dict(self.query, uploadId=self.upload_id)
+        response = self._session.post(self.url, params=params, data=body)
+        response.raise_for_status()
+
+        # S3 may report a failure inside a 200 response
+        error = _find(response.content, 'Code')
+        if error:
+            message = 'Multipart upload of %s failed: %s'
+            raise HTTPError(message % (self.filepath, error))
+
+        log.info('Completed multipart upload of %s', self.filepath)
+        return response
+
+    def _abort(self):
+        log.error('Aborting multipart upload of %s', self.filepath)
+        if self.upload_id:
+            params = dict(self.query, uploadId=self.upload_id)
+            self._session.delete(self.url, params=params)
+
+
+class TransferScheduler(object):
+    """Run S3 transfers with a bounded amount of concurrency.
+
+    At most `max_transfers` files are sent at the same time and at most
+    `max_bytes` bytes are in flight. A file larger than `max_bytes` is sent
+    alone. Files are only opened when their transfer starts and are closed
+    as soon as it ends, successfully or not.
+
+    Files with a `Content-Encoding: gzip` header are compressed on the fly
+    while they are sent, in a single request.
+
+    A transfer submitted with a `cancelled` event stops as soon as the
+    event is set, even half-way through the file, and its future raises
+    :class:`TransferCancelled`.
+
+    :param max_transfers: defaults to `settings.S3_MAX_TRANSFERS`
+    :param max_bytes: defaults to `settings.S3_MAX_INFLIGHT_BYTES`
+    """
+
+    def __init__(self, max_transfers=None, max_bytes=None, session=None):
+        max_transfers = max_transfers or settings.S3_MAX_TRANSFERS
+        self.max_bytes = max_bytes or settings.S3_MAX_INFLIGHT_BYTES
+        self.inflight_bytes = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=max_transfers)
+        self._condition = Condition()
+        self._session = session or get_session()
+
+    def submit(self, url, filepath, query, headers, cancelled=None):
+        """Schedule a transfer and return a future of the S3 response"""
+        return self._executor.submit(self._transfer,
+                                     url, filepath, query, headers, cancelled)
+
+    @contextmanager
+    def _reserve(self, length):
+        length = min(length, self.max_bytes)
+
+        with self._condition:
+            while self.inflight_bytes + length > self.max_bytes:
+                self._condition.wait()
+            self.inflight_bytes += length
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.inflight_bytes -= length
+                self._condition.notify_all()
+
+    def _transfer(self, url, filepath, query, headers, cancelled=None):
+        length = int(headers['Content-Length'])
+        compressed = headers.get('Content-Encoding') == 'gzip'
+
+        with self._reserve(length):
+            if cancelled and cancelled.is_set():
+                raise TransferCancelled('Cancelled before %s' % filepath)
+
+            if needs_multipart(length) and not compressed:
+                upload = MultipartUpload(url, filepath, query, headers,
+                                         session=self._session,
+                                         cancelled=cancelled)
+                return upload()
+
+            if compressed:
+                stream = GzipStream(filepath, length=length)
+            else:
+                stream = io.open(filepath, mode='rb')
+            if cancelled:
+                stream = CancellableStream(stream, length, cancelled)
+
+            with stream:
+                response = self._session.put(url,
+                                             headers=headers,
+                                             data=stream,
+                                             params=query)
+
+        if response.status_code == 200:
+            log.info('Successful S3 upload: %s', response.url)
+        return response
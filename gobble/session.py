@@ -0,0 +1,125 @@
+"""Share one pool of HTTP connections between all requests"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from gobble.config import settings
+
+
+class PooledAdapter(HTTPAdapter):
+    """A transport adapter with default timeouts and connection statistics.
+
+    Requests sent without a timeout get `timeout`. The adapter keeps count
+    of the requests it sends and of the connections it opens to send them,
+    including those of pools which have since been dropped.
+
+    :param timeout: a (connect, read) tuple of seconds
+    """
+
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        self._retired = {'requests': 0, 'connections': 0}
+        self._lock = Lock()
+        super(PooledAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PooledAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pools.dispose_func = self._retire
+
+    def send(self, request, timeout=None, **kwargs):
+        timeout = self.timeout if timeout is None else timeout
+        return super(PooledAdapter, self).send(request, timeout=timeout,
+                                               **kwargs)
+
+    def _retire(self, pool):
+        with self._lock:
+            self._retired['requests'] += pool.num_requests
+            self._retired['connections'] += pool.num_connections
+        pool.close()
+
+    @property
+    def stats(self):
+        """Count the requests sent and the connections opened and reused"""
+        pools = self.poolmanager.pools
+        with self._lock:
+            stats = dict(self._retired)
+            for key in pools.keys():
+                pool = pools[key]
+                stats['requests'] += pool.num_requests
+                stats['connections'] += pool.num_connections
+
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
+
+
+def make_session(pool_size=None, keep_alive=None, timeout=None):
+    """Return a new `requests.Session` configured from the settings.
+
+    :param pool_size: the number of connections kept open to each host
+        (defaults to `settings.HTTP_POOL_SIZE`)
+    :param keep_alive: keep connections open between requests (defaults to
+        `settings.HTTP_KEEP_ALIVE`)
+    :param timeout: a (connect, read) tuple of seconds (defaults to
+        `settings.HTTP_CONNECT_TIMEOUT` and `settings.HTTP_READ_TIMEOUT`)
+    """
+    pool_size = pool_size or settings.HTTP_POOL_SIZE
+    if keep_alive is None:
+        keep_alive = settings.HTTP_KEEP_ALIVE
+    timeout = timeout or (settings.HTTP_CONNECT_TIMEOUT,
+                          settings.HTTP_READ_TIMEOUT)
+
+    session = Session()
+    adapter = PooledAdapter(timeout=timeout,
+                            pool_connections=settings.HTTP_POOL_HOSTS,
+                            pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+_shared = {}
+_shared_lock = Lock()
+
+
+def get_session():
+    """Return the session shared by every endpoint and every upload"""
+    with _shared_lock:
+        if 'session' not in _shared:
+            _shared['session'] = make_session()
+        return _shared['session']
+
+
+def get_executor():
+    """Return the thread pool which fires the asynchronous requests.
+
+    It has `settings.HTTP_WORKERS` threads, so that many requests can wait
+    for an answer at the same time without holding up the event loop's
+    default executor, which hashes and validates files.
+    """
+    with _shared_lock:
+        if 'executor' not in _shared:
+            workers = settings.HTTP_WORKERS
+            _shared['executor'] = ThreadPoolExecutor(max_workers=workers)
+        return _shared['executor']
+
+
+def connection_stats(session=None):
+    """Return the connection statistics of a session (the shared one)
+
+    :return: a `dict` with the number of `requests` sent, `connections`
+        opened and connections `reused`, added up over all adapters
+    """
+    session = session or get_session()
+    stats = {'requests': 0, 'connections': 0, 'reused': 0}
+
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        if isinstance(adapter, PooledAdapter):
+            for key, value in adapter.stats.items():
+                stats[key] += value
+    return stats
@@ -0,0 +1,624 @@
+"""Validate the data files of a package with GoodTables"""
+import csv
+import io
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO, StringIO
+from os.path import getsize
+from random import Random
+
+from datapackage import Profile
+from datapackage.exceptions import ValidationError
+from goodtables.pipeline import Pipeline
+from goodtables.utilities.helpers import set_meta_stats
+from jsonschema.validators import validator_for
+
+from gobble import vectorized
+from gobble.cache import ValidationCache
+from gobble.config import settings
+from gobble.logger import log
+from gobble.progress import SAMPLE_SIZE
+
+
+FISCAL_PROFILE = 'fiscal-data-package'
+
+
+def profile_version(profile):
+    """Return a hash of the JSON schema of a `datapackage.Profile`"""
+    return ValidationCache.key(profile.name, profile.jsonschema)
+
+
+class ProfileValidator(object):
+    """A data-package profile, compiled into a reusable JSON schema validator.
+
+    Loading, checking and compiling a profile costs much more than using it,
+    so there should only be one of these per profile and per process: use
+    :func:`get_validator`.
+
+    :param name: the name of the profile in the data-package registry
+    """
+
+    def __init__(self, name):
+        profile = Profile(name)
+        self.name = name
+        self.version = profile_version(profile)
+        self._validator = validator_for(profile.jsonschema)(profile.jsonschema)
+
+    def errors(self, descriptor):
+        """Return the errors in a descriptor as a list of `dict` objects.
+
+        Each error has a `message`, the `path` of the faulty property in the
+        descriptor and the `profile_path` of the broken rule in the profile.
+        """
+        return [{
+            'message': error.message,
+            'path': '/'.join(map(str, error.path)),
+            'profile_path': '/'.join(map(str, error.schema_path)),
+        } for error in self._validator.iter_errors(descriptor)]
+
+    def validate(self, descriptor):
+        """Validate a descriptor like `datapackage.Profile.validate` does.
+
+        :raise: :class:`ValidationError` with one error per problem
+        """
+        errors = self.errors(descriptor)
+        if errors:
+            template = ('Descriptor validation error: %(message)s at '
+                        '"%(path)s" in descriptor and at "%(profile_path)s" '
+                        'in profile')
+            message = 'There are %s validation errors (see exception.errors)'
+            raise ValidationError(message % len(errors), errors=[
+                ValidationError(template % error) for error in errors
+            ])
+        return True
+
+    def validate_many(self, descriptors):
+        """Return the list of errors of each descriptor (see :meth:`errors`)"""
+        return [self.errors(descriptor) for descriptor in descriptors]
+
+
+@lru_cache(maxsize=None)
+def get_validator(name=FISCAL_PROFILE):
+    """Return the process-wide :class:`ProfileValidator` for a profile"""
+    log.debug('Compiling the %s profile', name)
+    return ProfileValidator(name)
+
+
+def validate_descriptors(descriptors, profile=FISCAL_PROFILE):
+    """Validate many descriptors in one go.
+
+    :param descriptors: an iterable of descriptors (`dict` objects)
+    :param profile: the name of the profile (fiscal by default)
+
+    :return: a list of errors for each descriptor, empty if it is valid
+    """
+    return get_validator(profile).validate_many(descriptors)
+
+
+def read_header(filepath):
+    """Return the column names in the first row of a CSV file"""
+    with io.open(filepath, encoding='utf-8-sig', errors='replace',
+                 newline='') as stream:
+        return next(csv.reader(stream), [])
+
+
+def model_sources(model):
+    """Return the columns which a fiscal model refers to.
+
+    :return: a list of (reference, column) tuples, where the reference is
+        the measure or dimension attribute, for example `date.Ciclo`
+    """
+    sources = [('measures.%s' % name, measure['source'])
+               for name, measure in model.get('measures', {}).items()
+               if 'source' in measure]
+
+    for dimension, info in model.get('dimensions', {}).items():
+        attributes = info.get('attributes', {})
+        sources.extend(('%s.%s' % (dimension, name), attribute['source'])
+                       for name, attribute in attributes.items()
+                       if 'source' in attribute)
+    return sources
+
+
+def check_model(model, resources):
+    """Cross-check a fiscal model with the schemas and headers of the data.
+
+    Only the header row of each data file is needed, so the check takes
+    milliseconds and can run before any expensive step. A problem is
+    reported for each column of the model which is missing from the schemas
+    or from the data files, and for each schema field missing from the
+    header of its data file. Columns which are only in a header are logged.
+
+    :param model: the fiscal `model` of the descriptor
+    :param resources: a list of (path, header, schema) tuples
+
+    :return: a list of error messages, empty if all is consistent
+    """
+    errors = []
+    fields = set()
+    columns = set()
+
+    for path, header, schema in resources:
+        names = [field['name'] for field in schema.get('fields', [])]
+        fields.update(names)
+        columns.update(header)
+
+        for name in names:
+            if name not in header:
+                message = 'the field "%s" is not in the header of %s'
+                errors.append(message % (name, path))
+
+        extra = [column for column in header if column not in names]
+        if extra:
+            log.warning('%s has columns which are not in its schema: %s',
+                        path, ', '.join(extra))
+
+    for reference, source in model_sources(model):
+        if source not in fields:
+            message = 'the model (%s) refers to "%s", which is not a field'
+            errors.append(message % (reference, source))
+        elif source not in columns:
+            message = 'the model (%s) refers to "%s", which is in no header'
+            errors.append(message % (reference, source))
+
+    return errors
+
+
+class ErrorBudgetExceeded(ValidationError):
+    """A data file has more errors than its :class:`ErrorBudget` allows"""
+
+
+class _OverBudget(Exception):
+    pass
+
+
+class ErrorBudget(object):
+    """The number of errors a data file may have before validation gives up.
+
+    A budget counts the errors it is given (see :meth:`spend`) and is spent
+    as soon as there are more bad rows or more errors in a single column
+    than allowed. A limit of `None` means no limit.
+
+    :param max_bad_rows: the maximum number of rows with errors
+    :param max_column_errors: the maximum number of errors in any column
+    """
+
+    def __init__(self, max_bad_rows=None, max_column_errors=None):
+        self.max_bad_rows = max_bad_rows
+        self.max_column_errors = max_column_errors
+        self.bad_rows = set()
+        self.column_errors = defaultdict(int)
+
+    def __repr__(self):
+        args = self.max_bad_rows, self.max_column_errors
+        return '<ErrorBudget: %s bad rows, %s errors per column>' % args
+
+    @property
+    def exceeded(self):
+        if self.max_bad_rows is not None \
+                and len(self.bad_rows) > self.max_bad_rows:
+            return True
+        if self.max_column_errors is not None and self.column_errors:
+            return max(self.column_errors.values()) > self.max_column_errors
+        return False
+
+    def renew(self):
+        """Return an untouched budget with the same limits"""
+        return ErrorBudget(self.max_bad_rows, self.max_column_errors)
+
+    def spend(self, result):
+        """Count a report result and return true if the budget is exceeded"""
+        if result['result_category'] == 'row' \
+                and result['result_level'] == 'error':
+            if result['row_index'] is not None:
+                self.bad_rows.add(result['row_index'])
+            if result['column_index'] is not None:
+                self.column_errors[result['column_index']] += 1
+        return self.exceeded
+
+
+def _run_pipeline(source, schema, budget=None, **options):
+    pipeline = Pipeline(source, report_stream=StringIO(), **options)
+    # Unless the processor shares the report of the pipeline, its results
+    # are lost, and so are the row and report limits
+    pipeline.register_processor('schema', options={
+        'schema': schema,
+        'report': pipeline.report,
+        'row_limit': pipeline.row_limit,
+        'report_limit': pipeline.report_limit,
+    })
+
+    if budget:
+        write = pipeline.report.write
+
+        def write_within_budget(entry):
+            write(entry)
+            if budget.spend(entry):
+                raise _OverBudget()
+
+        # Processors all write to the report of the pipeline
+        pipeline.report.write = write_within_budget
+
+    try:
+        valid, report = pipeline.run()
+    except _OverBudget:
+        log.debug('Stopped validating: %r exceeded', budget)
+        pipeline.set_report_meta()
+        valid, report = False, pipeline.report
+
+    feedback = report.generate()
+    if budget and budget.exceeded:
+        feedback['meta']['truncated'] = True
+    return valid, feedback
+
+
+def validate_resource(filepath, schema, budget=None):
+    """Validate one data file against its schema.
+
+    This function runs inside a worker process, so it only takes and returns
+    plain data. With an error budget, validation stops as soon as the budget
+    is exceeded and the report is marked as `truncated` in its `meta`.
+
+    :param filepath: the absolute path of the data file
+    :param schema: the table schema of the resource (a `dict`)
+    :param budget: an :class:`ErrorBudget`
+
+    :return: a (valid, report) tuple where the report is a `dict`
+    """
+    if vectorized.supports(schema):
+        with io.open(filepath, 'rb') as stream:
+            return _validate_bytes(stream.read(), schema, budget)
+
+    return _run_pipeline(filepath, schema, budget=budget)
+
+
+def validate_chunk(filepath, schema, header_end, start, end, budget=None):
+    """Validate one chunk of a data file against its schema.
+
+    The chunk is validated as a small CSV file made of the header row and
+    the rows between the `start` and `end` byte offsets. Like
+    :func:`validate_resource`, this function runs inside a worker process.
+
+    :return: a (valid, report) tuple where the report is a `dict`
+    """
+    with io.open(filepath, 'rb') as stream:
+        header = stream.read(header_end)
+        stream.seek(start)
+        rows = stream.read(end - start)
+
+    return _validate_bytes(header + rows, schema, budget)
+
+
+def _validate_bytes(content, schema, budget=None):
+    if vectorized.supports(schema):
+        outcome = _validate_flagged(content, schema, budget)
+        if outcome:
+            return outcome
+
+    return _run_pipeline(BytesIO(content), schema,
+                         budget=budget,
+                         row_limit=Pipeline.ROW_LIMIT_MAX)
+
+
+def _validate_flagged(content, schema, budget=None):
+    """Validate only the rows which fail the bulk checks with GoodTables.
+
+    The rows are flagged by :func:`gobble.vectorized.flag_rows` and then
+    validated along with the header row, so the report is the one GoodTables
+    would give for the whole file. Return `None` if the content cannot be
+    parsed in the same way as GoodTables does.
+    """
+    try:
+        text = content.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+    headers, row_count, rows = vectorized.flag_rows(text, schema)
+    log.debug('%s of %s rows flagged for validation', len(rows), row_count)
+
+    stream = StringIO(newline='')
+    writer = csv.writer(stream, lineterminator='\n')
+    writer.writerows(row for _, row in rows)
+    header_end = content.find(b'\n') + 1 or len(content)
+    subset = content[:header_end] + stream.getvalue().encode('utf-8')
+
+    valid, report = _run_pipeline(BytesIO(subset), schema,
+                                  budget=budget and budget.renew(),
+                                  row_limit=Pipeline.ROW_LIMIT_MAX)
+    if report['meta'].get('headers') != headers:
+        return None
+
+    indexes = [index for index, _ in rows]
+    for result in report['results']:
+        if result['row_index'] is not None:
+            result['row_index'] = indexes[result['row_index']]
+
+    report['meta']['row_count'] = row_count or 1
+    set_meta_stats(report)
+    return valid, report
+
+
+def sample_rows(filepath, size, strategy='stratified', seed=None):
+    """Pick rows from a CSV file by seeking to random positions.
+
+    With the `random` strategy, positions are drawn uniformly from the whole
+    file. With the `stratified` strategy, the file is cut into `size` equal
+    slices and one position is drawn from each slice, so that every part of
+    the file is represented. The row picked for a position is the first one
+    starting after it. Only one row is read per position, so the time taken
+    does not depend on the size of the file.
+
+    :param size: the number of positions to draw (duplicates are dropped)
+    :param strategy: `stratified` or `random`
+    :param seed: a seed for the random number generator
+
+    :return: a (header, rows) tuple, where rows is a sorted list of
+        (byte offset, row) tuples
+    """
+    generator = Random(seed)
+    length = getsize(filepath)
+
+    with io.open(filepath, 'rb') as stream:
+        header = stream.readline()
+        start = len(header)
+        span = max(length - start, 1)
+
+        if strategy == 'random':
+            positions = [start + generator.randrange(span)
+                         for _ in range(size)]
+        elif strategy == 'stratified':
+            positions = [start + int(span * (slot + generator.random()) / size)
+                         for slot in range(size)]
+        else:
+            raise ValueError('Unknown sampling strategy: %s' % strategy)
+
+        rows = {}
+        for position in sorted(positions):
+            # Skip to the end of the row the position falls into
+            stream.seek(position - 1)
+            stream.readline()
+            offset = stream.tell()
+            row = stream.readline()
+            if row.strip():
+                rows[offset] = row if row.endswith(b'\n') else row + b'\n'
+
+    return header, sorted(rows.items())
+
+
+def validate_sample(filepath, schema, size, strategy='stratified',
+                    budget=None):
+    """Validate the header and a sample of the rows of a data file.
+
+    The sample is drawn by :func:`sample_rows`. The report is labeled as
+    sampled in its `meta` and each result gets the byte `offset` of its row
+    in the file, since row indexes only count sampled rows.
+
+    :return: a (valid, report) tuple where the report is a `dict`
+    """
+    header, rows = sample_rows(filepath, size, strategy=strategy)
+    content = header + b''.join(row for _, row in rows)
+    valid, report = _validate_bytes(content, schema, budget)
+
+    offsets = [offset for offset, _ in rows]
+    for result in report['results']:
+        index = result['row_index']
+        if index is not None and index < len(offsets):
+            result['offset'] = offsets[index]
+
+    report['meta'].update(sampled=True,
+                          sample_strategy=strategy,
+                          sample_size=len(rows),
+                          file_size=getsize(filepath))
+    return valid, report
+
+
+def split_rows(filepath, chunk_size=None):
+    """Split a CSV file into byte ranges which start and end on row boundaries.
+
+    Boundaries are found by seeking to every `chunk_size` bytes and reading
+    on to the end of the row, so the file is never read as a whole. Line
+    breaks inside quoted values are not supported.
+
+    :param chunk_size: defaults to :func:`chunk_size_for` the file
+
+    :return: a (header end, chunks) tuple, where the chunks are a list of
+        (start, end) byte offsets
+    """
+    length = getsize(filepath)
+    chunk_size = chunk_size or chunk_size_for(filepath)
+
+    with io.open(filepath, 'rb') as stream:
+        header_end = len(stream.readline())
+        boundaries = [header_end]
+
+        while boundaries[-1] < length:
+            stream.seek(boundaries[-1] + chunk_size - 1)
+            stream.readline()
+            boundaries.append(min(stream.tell(), length))
+
+    return header_end, list(zip(boundaries, boundaries[1:]))
+
+
+def chunk_size_for(filepath):
+    """Return a chunk size that keeps chunks under the GoodTables row limit.
+
+    The average row length is estimated on the first bytes of the file, and
+    chunks hold at most half the row limit, to leave room for longer rows.
+    """
+    with io.open(filepath, 'rb') as stream:
+        sample = stream.read(SAMPLE_SIZE)
+
+    row_length = len(sample) / max(sample.count(b'\n'), 1)
+    limit = int(row_length * Pipeline.ROW_LIMIT_MAX / 2)
+    return max(min(settings.VALIDATION_CHUNK_SIZE, limit), 1)
+
+
+def validate_resources(targets, sample=None, sample_size=None, budget=None):
+    """Validate several data files in parallel.
+
+    Files larger than `settings.VALIDATION_CHUNK_SIZE` are split into chunks
+    of whole rows (see :func:`split_rows`). Files and chunks are validated
+    in separate processes, by up to `settings.VALIDATION_WORKERS` processes
+    at the same time, and the chunk reports of each file are merged back
+    together (see :func:`merge_chunks`). A single small file is validated
+    in the current process.
+
+    :param targets: a list of (filepath, schema) tuples
+    :param sample: only validate a sample of rows drawn with this strategy
+        (see :func:`validate_sample`)
+    :param sample_size: defaults to `settings.VALIDATION_SAMPLE_SIZE`
+    :param budget: an :class:`ErrorBudget` for each file: the chunks of a
+        file which exceeds its budget are not validated any further
+
+    :return: a list of (valid, report) tuples, in the order of the targets
+    """
+    tasks = []
+    for index, (filepath, schema) in enumerate(targets):
+        if sample:
+            size = sample_size or settings.VALIDATION_SAMPLE_SIZE
+            tasks.append((index, validate_sample,
+                          (filepath, schema, size, sample, budget)))
+        elif getsize(filepath) > settings.VALIDATION_CHUNK_SIZE:
+            header_end, chunks = split_rows(filepath)
+            log.debug('Validating %s in %s chunks', filepath, len(chunks))
+            tasks.extend((index, validate_chunk,
+                          (filepath, schema, header_end, start, end, budget))
+                         for start, end in chunks)
+        else:
+            tasks.append((index, validate_resource,
+                          (filepath, schema, budget)))
+
+    if len(tasks) < 2:
+        return [function(*args[:-1], budget=budget and budget.renew())
+                for _, function, args in tasks]
+
+    workers = min(settings.VALIDATION_WORKERS, len(tasks))
+    log.debug('Validating %s tasks with %s processes', len(tasks), workers)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = defaultdict(list)
+        for index, function, args in tasks:
+            futures[index].append(pool.submit(function, *args))
+
+        outcomes = []
+        for index in range(len(targets)):
+            outcomes.append(merge_chunks(_consume(futures[index]), budget))
+            # Only left over if the budget of the file was exceeded
+            for future in futures[index]:
+                future.cancel()
+
+        return outcomes
+
+
+def _consume(futures):
+    # Let go of each report as soon as it has been merged
+    while futures:
+        yield futures.pop(0).result()
+
+
+def merge_chunks(outcomes, budget=None):
+    """Merge the reports of the consecutive chunks of one file.
+
+    Row indexes are rebased on the number of rows in the previous chunks.
+    Header and file level results are only kept for the first chunk, where
+    they would otherwise be repeated. Like GoodTables, the merged report
+    keeps at most `Pipeline.REPORT_LIMIT_MAX` results, but its counts cover
+    all the rows.
+
+    With an error budget, merging stops after the chunk which exceeds it and
+    the merged report is marked as `truncated`.
+
+    :param outcomes: an iterable of (valid, report) tuples, in file order
+    :param budget: an :class:`ErrorBudget` for the whole file
+
+    :return: a single (valid, report) tuple
+    """
+    valid = True
+    meta = None
+    results = []
+    bad_columns = set()
+    bad_types = defaultdict(int)
+    budget = budget and budget.renew()
+    truncated = False
+
+    for number, (chunk_valid, report) in enumerate(outcomes):
+        valid = valid and chunk_valid
+        if meta is None:
+            meta = dict(report['meta'], row_count=0, bad_row_count=0)
+        offset = meta['row_count']
+
+        for result in report['results']:
+            if result['row_index'] is not None:
+                result = dict(result, row_index=result['row_index'] + offset)
+            elif number:
+                continue
+
+            if result['result_category'] == 'row' \
+                    and result['result_level'] == 'error' \
+                    and result['column_index'] is not None:
+                bad_columns.add(result['column_index'])
+            if len(results) < Pipeline.REPORT_LIMIT_MAX:
+                results.append(result)
+            if budget:
+                budget.spend(result)
+
+        for column in report['meta'].get('columns', []):
+            share = column['bad_type_percent'] * report['meta']['row_count']
+            bad_types[column['index']] += share
+
+        meta['row_count'] += report['meta']['row_count']
+        meta['bad_row_count'] += report['meta']['bad_row_count']
+
+        truncated = report['meta'].get('truncated') or \
+            bool(budget and budget.exceeded)
+        if truncated:
+            valid = False
+            break
+
+    row_count = meta['row_count'] or 1
+    meta['bad_column_count'] = len(bad_columns)
+    meta['columns'] = [
+        dict(column,
+             bad_type_percent=int(bad_types[column['index']] / row_count))
+        for column in meta.get('columns', [])
+    ]
+    meta['chunks'] = number + 1
+    if truncated:
+        meta['truncated'] = True
+
+    return valid, {'meta': meta, 'results': results}
+
+
+def merge_reports(reports):
+    """Merge the reports of several resources into one report.
+
+    The merged report has the same layout as a GoodTables report. Each result
+    is tagged with the `path` of its resource, the counts in `meta` are added
+    up and the original `meta` of each resource is kept under
+    `meta['resources']`. If any resource was sampled, so is the merged report.
+
+    :param reports: a `dict` of GoodTables reports keyed by resource path
+    """
+    merged = {
+        'meta': {
+            'row_count': 0,
+            'bad_row_count': 0,
+            'bad_column_count': 0,
+            'resources': {},
+        },
+        'results': [],
+    }
+
+    for path, report in reports.items():
+        meta = report['meta']
+        for key in ('row_count', 'bad_row_count', 'bad_column_count'):
+            merged['meta'][key] += meta.get(key, 0)
+        merged['meta']['resources'][path] = meta
+        if meta.get('sampled'):
+            merged['meta']['sampled'] = True
+        merged['results'].extend(dict(result, path=path)
+                                 for result in report['results'])
+
+    return merged
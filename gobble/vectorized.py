@@ -0,0 +1,163 @@
+"""Check the measure and date columns of CSV files in bulk with NumPy"""
+import csv
+
+from io import StringIO
+from itertools import islice
+
+from jsontableschema.helpers import NULL_VALUES
+
+from gobble.config import settings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Field properties which do not change how values are checked
+DEFAULTS = {'format': 'default', 'groupChar': ',', 'decimalChar': '.'}
+
+# The lengths of the months (padded so that January is at index 1)
+MONTH_DAYS = [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+# GoodTables reports rows with nothing but empty strings
+EMPTY_ROW = frozenset([''])
+
+
+def _check_string(values):
+    return numpy.ones(len(values), dtype=bool)
+
+
+def _check_integer(values):
+    text = numpy.char.strip(values)
+    digits = numpy.char.lstrip(text, '+-')
+    signs = numpy.char.str_len(text) - numpy.char.str_len(digits)
+    return numpy.char.isdecimal(digits) & (signs <= 1)
+
+
+def _check_number(values):
+    text = numpy.char.strip(numpy.char.replace(values, ',', ''))
+    unsigned = numpy.char.lstrip(text, '+-')
+    signs = numpy.char.str_len(text) - numpy.char.str_len(unsigned)
+    parts = numpy.char.partition(unsigned, '.')
+    digits = numpy.char.add(parts[:, 0], parts[:, 2])
+    return numpy.char.isdecimal(digits) & (signs <= 1)
+
+
+def _check_date(values):
+    valid = numpy.char.str_len(values) == 10
+    if not valid.any():
+        return valid
+
+    # Look at the code points of the ten characters of each date
+    text = numpy.where(valid, values, '0000-00-00').astype('U10')
+    codes = text.view(numpy.uint32).reshape(len(text), 10).astype(numpy.int64)
+    digits = codes[:, [0, 1, 2, 3, 5, 6, 8, 9]] - ord('0')
+    valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+    valid &= (codes[:, 4] == ord('-')) & (codes[:, 7] == ord('-'))
+
+    year = digits[:, :4].dot([1000, 100, 10, 1])
+    month = digits[:, 4:6].dot([10, 1])
+    day = digits[:, 6:].dot([10, 1])
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+
+    valid &= (year >= 1) & (month >= 1) & (month <= 12)
+    month_days = numpy.array(MONTH_DAYS)[numpy.clip(month, 0, 12)]
+    month_days += (month == 2) & leap
+    return valid & (day >= 1) & (day <= month_days)
+
+
+CHECKS = {
+    'string': _check_string,
+    'integer': _check_integer,
+    'number': _check_number,
+    'date': _check_date,
+}
+
+
+def supports(schema):
+    """Can every field of a schema be checked in bulk?
+
+    Only the types in `CHECKS`, in their default format, with no constraint
+    other than `required`, are supported. NumPy must be installed.
+    """
+    if numpy is None:
+        return False
+
+    for field in schema.get('fields', []):
+        if field.get('type', 'string') not in CHECKS:
+            return False
+        if set(field.get('constraints', {})) - {'required'}:
+            return False
+        if field.get('missingValues'):
+            return False
+        for key, default in DEFAULTS.items():
+            if field.get(key, default) != default:
+                return False
+
+    return True
+
+
+def flag_rows(text, schema, block_rows=None):
+    """Return the rows of a CSV file which may break its schema.
+
+    Rows are parsed in blocks of `block_rows`, and the values of each
+    column are checked for the whole block at once. The checks accept a
+    subset of the values GoodTables accepts, so a row which is not flagged
+    is valid, while a flagged row may still turn out to be valid. Defective
+    rows, empty rows, every copy of a duplicate row and rows with a missing
+    required value are flagged too.
+
+    :param text: the content of the CSV file, as a string
+    :param schema: the table schema (see :func:`supports`)
+    :param block_rows: defaults to `settings.VALIDATION_BLOCK_ROWS`
+
+    :return: a (headers, row count, flagged rows) tuple, where the flagged
+        rows are a list of (index, row) tuples
+    """
+    block_rows = block_rows or settings.VALIDATION_BLOCK_ROWS
+    reader = csv.reader(StringIO(text, newline=''))
+    headers = next(reader, [])
+
+    fields = {field['name']: field for field in schema.get('fields', [])}
+    columns = [(index, fields[header]) for index, header in enumerate(headers)
+               if header in fields]
+
+    seen = {}
+    flagged = {}
+    row_count = 0
+
+    for block in iter(lambda: list(islice(reader, block_rows)), []):
+        start = row_count
+        row_count += len(block)
+        complete = []
+
+        for index, row in enumerate(block, start):
+            key = frozenset(row)
+            if key in seen:
+                first = seen[key]
+                flagged[first[0]] = first[1]
+                flagged[index] = row
+            else:
+                seen[key] = index, row
+
+            if len(row) != len(headers) or key <= EMPTY_ROW:
+                flagged[index] = row
+            else:
+                complete.append(index)
+
+        if complete and columns:
+            table = numpy.array([block[index - start] for index in complete])
+            for column, field in columns:
+                values = table[:, column]
+                check = CHECKS[field.get('type', 'string')]
+                nulls = numpy.isin(numpy.char.lower(values), NULL_VALUES)
+                if field.get('constraints', {}).get('required'):
+                    valid = ~nulls & check(values)
+                else:
+                    valid = nulls | check(values)
+                for position in numpy.flatnonzero(~valid).tolist():
+                    index = complete[position]
+                    flagged[index] = block[index - start]
+
+    return headers, row_count, sorted(flagged.items())
@@ -39,6 +39,7 @@ setup(
     package_dir={package['slug']: package['slug']},
     install_requires=requirements,
     tests_require=requirements_dev + requirements,
+    extras_require={'fast': ['numpy']},
     test_suite='nose.collector',
     zip_safe=False,
     keywords=package['keywords'],
@@ -1,15 +1,23 @@
 """Fixtures for test modules"""
 import io
-from json import loads
+from json import loads, dumps
 from os import makedirs
 from os.path import join, expanduser
-from shutil import rmtree
+from re import compile as regex
+from shutil import rmtree, copytree
+from types import SimpleNamespace
 from unittest.mock import patch
 
+import responses
+
 from gobble.snapshot import SNAPSHOTS_DIR
 from pytest import fixture
 
 from gobble import FiscalDataPackage
+from gobble.api import (request_upload,
+                        upload_package,
+                        upload_status,
+                        toggle_publish)
 from gobble.config import settings, GOBBLE_MODE
 from gobble.config import ROOT_DIR
 
@@ -45,7 +53,8 @@ def invalid_fiscal_package():
 @fixture
 def tmp_user_dir(request):
     original = settings.USER_DIR
-    settings.USER_DIR = join(expanduser('~'), '.gobble.tmp')
+    temporary = join(expanduser('~'), '.gobble.tmp')
+    settings.USER_DIR = temporary
     try:
         makedirs(settings.USER_DIR)
     except IOError:
@@ -54,13 +63,58 @@ def tmp_user_dir(request):
     def switch_back():
         settings.USER_DIR = original
         try:
-            rmtree(settings.USER_DIR)
+            rmtree(temporary)
         except IOError:
             pass
 
     request.addfinalizer(switch_back)
 
 
+# noinspection PyShadowingNames,PyUnusedLocal
+@fixture
+def package_copy(tmp_user_dir):
+    """A copy of the sample package that uploads are allowed to modify"""
+    folder = join(settings.USER_DIR, 'datapackage')
+    copytree(join(ROOT_DIR, 'assets', 'datapackage'), folder)
+    return join(folder, 'datapackage.json')
+
+
+# Fake the Open-Spending conductor and S3
+# -----------------------------------------------------------------------------
+
+@fixture
+def dummy_user():
+    return SimpleNamespace(
+        id='me',
+        name='Me',
+        permissions={'os.datastore': {'token': 'secret'}}
+    )
+
+
+@fixture
+def fake_conductor():
+    """Answer all upload requests for the sample package successfully"""
+    upload_urls = {
+        path: {
+            'upload_url': 'http://fakes3/fake-bucket/me/mfb2/' + path,
+            'upload_query': {'jwt': ['secret']},
+            'type': 'text/csv',
+        } for path in ('data/data.csv', 'datapackage.json')
+    }
+    s3_objects = regex('http://fakes3/fake-bucket/.*')
+    status = '{"status": "done", "progress": 100}'
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as mock:
+        mock.add(request_upload.method, request_upload.url,
+                 body=dumps({'filedata': upload_urls}))
+        mock.add('PUT', s3_objects)
+        mock.add(upload_package.method, upload_package.url, body='{}')
+        mock.add(upload_status.method, upload_status.url, body=status)
+        mock.add(toggle_publish.method, toggle_publish.url,
+                 body='{"success": true}')
+        yield mock
+
+
 # User authentication and permission
 # -----------------------------------------------------------------------------
 DUMMY_DIR = join(ROOT_DIR, 'assets', 'dummy')
@@ -0,0 +1,45 @@
+"""Test the batch module"""
+from os.path import join, dirname
+from shutil import copytree
+from unittest.mock import patch
+
+# noinspection PyUnresolvedReferences
+from tests.fixtures import (tmp_user_dir,
+                            package_copy,
+                            dummy_user,
+                            fake_conductor)
+from gobble.batch import find_descriptors, upload_many
+from gobble.config import ROOT_DIR
+
+
+VALIDATION_DIR = join(ROOT_DIR, 'assets', 'validation')
+
+
+def test_find_descriptors_searches_folders_recursively():
+    descriptors = find_descriptors([VALIDATION_DIR])
+    assert len(descriptors) == 8
+    assert all(path.endswith('datapackage.json') for path in descriptors)
+
+
+def test_find_descriptors_accepts_files_too():
+    filepath = join(ROOT_DIR, 'assets', 'datapackage', 'invalid.json')
+    assert find_descriptors([filepath]) == [filepath]
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@patch('gobble.fiscal.async_sleep')
+def test_upload_many_reports_every_package(_, package_copy, dummy_user,
+                                           fake_conductor):
+    folder = dirname(dirname(package_copy))
+    copytree(dirname(package_copy), join(folder, 'copy'))
+    missing = join(folder, 'missing.json')
+
+    results = upload_many([folder, missing],
+                          user=dummy_user,
+                          skip_validation=True,
+                          max_loads=1)
+
+    assert len(results) == 3
+    assert [bool(result.url) for result in results] == [True, True, False]
+    assert isinstance(results[-1].error, Exception)
+    assert all(result.seconds >= 0 for result in results)
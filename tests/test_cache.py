@@ -0,0 +1,105 @@
+"""Test the cache module"""
+import io
+from os.path import join
+from unittest.mock import patch
+
+# noinspection PyUnresolvedReferences
+from tests.fixtures import tmp_user_dir
+from gobble.cache import (Manifest,
+                          Ledger,
+                          ValidationCache,
+                          FileCache,
+                          compute_hash,
+                          compute_hashes)
+from gobble.config import ROOT_DIR, settings
+
+
+DATA_FILE = join(ROOT_DIR, 'assets', 'datapackage', 'data', 'data.csv')
+
+
+class DummyCache(FileCache):
+    filename = 'dummy.json'
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_file_cache_survives_a_new_instance(tmp_user_dir):
+    cache = DummyCache()
+    cache['foo'] = 'bar'
+    cache.save()
+    assert DummyCache() == {'foo': 'bar'}
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_file_caches_sharing_a_file_keep_each_others_keys(tmp_user_dir):
+    first, second = DummyCache(), DummyCache()
+    first['foo'] = 'bar'
+    first.save()
+    second['spam'] = 'eggs'
+    second.save()
+    assert DummyCache() == {'foo': 'bar', 'spam': 'eggs'}
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_manifest_describes_file_correctly(tmp_user_dir):
+    entry = Manifest().describe(DATA_FILE)
+    assert entry['md5'] == compute_hash(DATA_FILE)
+    assert entry['length'] == 50556
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_manifest_hashes_unchanged_file_only_once(tmp_user_dir):
+    with patch('gobble.cache.compute_hash', return_value='x') as hasher:
+        Manifest().describe(DATA_FILE)
+        Manifest().describe(DATA_FILE)
+        assert hasher.call_count == 1
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_manifest_rehashes_modified_file(tmp_user_dir):
+    filepath = join(settings.USER_DIR, 'data.csv')
+    manifest = Manifest()
+
+    with io.open(filepath, 'w') as file:
+        file.write('foo,bar\n')
+    before = manifest.describe(filepath)['md5']
+
+    with io.open(filepath, 'w') as file:
+        file.write('foo,bar,spam\n')
+    after = manifest.describe(filepath)['md5']
+
+    assert before != after
+
+
+def test_compute_hash_does_not_depend_on_block_size():
+    assert compute_hash(DATA_FILE, block_size=7) == compute_hash(DATA_FILE)
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_manifest_hashes_many_files_in_one_go(tmp_user_dir):
+    filepaths = []
+    for i in range(5):
+        filepaths.append(join(settings.USER_DIR, '%s.csv' % i))
+        with io.open(filepaths[-1], 'w') as file:
+            file.write('foo,bar\n%s,%s\n' % (i, i))
+
+    entries = Manifest().describe_all(filepaths)
+    hashes = compute_hashes(filepaths)
+
+    assert [entry['md5'] for entry in entries] == \
+        [hashes[filepath] for filepath in filepaths]
+    assert len(set(hashes.values())) == 5
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_ledger_remembers_pushed_files(tmp_user_dir):
+    Ledger().record('me', 'budget', {'data.csv': 'foo'})
+    assert Ledger().has('me', 'budget', 'data.csv', 'foo')
+    assert not Ledger().has('me', 'budget', 'data.csv', 'bar')
+    assert not Ledger().has('you', 'budget', 'data.csv', 'foo')
+
+
+def test_validation_cache_keys_depend_on_content_not_order():
+    key = ValidationCache.key('v1', {'a': 1, 'b': 2}, 'md5')
+    assert key == ValidationCache.key('v1', {'b': 2, 'a': 1}, 'md5')
+    assert key != ValidationCache.key('v2', {'a': 1, 'b': 2}, 'md5')
+    assert key != ValidationCache.key('v1', {'a': 1, 'b': 2}, 'other')
@@ -0,0 +1,44 @@
+"""Test the compression module"""
+import gzip
+import io
+from base64 import b64encode
+from hashlib import md5
+from os.path import join
+from unittest.mock import patch
+
+from gobble.compression import GzipStream, describe_compressed
+from gobble.config import ROOT_DIR, settings
+
+
+DATA_FILE = join(ROOT_DIR, 'assets', 'datapackage', 'data', 'data.csv')
+
+
+def test_gzip_stream_decompresses_to_the_original_file():
+    with io.open(DATA_FILE, 'rb') as file:
+        original = file.read()
+    with GzipStream(DATA_FILE) as stream:
+        compressed = stream.read()
+
+    assert gzip.decompress(compressed) == original
+    assert len(compressed) < len(original)
+
+
+def test_gzip_stream_is_the_same_whatever_the_read_size():
+    with GzipStream(DATA_FILE) as stream:
+        whole = stream.read()
+
+    with patch.object(settings, 'HASHING_BLOCK_SIZE', 1000):
+        with GzipStream(DATA_FILE) as stream:
+            pieces = list(iter(lambda: stream.read(777), b''))
+
+    assert b''.join(pieces) == whole
+
+
+def test_describe_compressed_matches_the_stream():
+    with GzipStream(DATA_FILE) as stream:
+        body = stream.read()
+
+    description = describe_compressed(DATA_FILE)
+
+    assert description['length'] == len(body)
+    assert description['md5'] == b64encode(md5(body).digest()).decode()
@@ -53,3 +53,11 @@ def test_localhost_is_a_netloc_tuple(settings):
 @mark.parametrize('settings', configurations)
 def test_expanded_log_style_setting_is_set(settings):
     assert isinstance(settings.EXPANDED_LOG_STYLE, bool)
+
+
+@mark.parametrize('settings', configurations)
+def test_hashing_settings_are_positive_integers(settings):
+    assert isinstance(settings.HASHING_WORKERS, int)
+    assert isinstance(settings.HASHING_BLOCK_SIZE, int)
+    assert settings.HASHING_WORKERS > 0
+    assert settings.HASHING_BLOCK_SIZE > 0
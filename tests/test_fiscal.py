@@ -1,15 +1,39 @@
 """Tests for the uploader module"""
 import datapackage
-from os.path import join
+import gzip
+import io
+import responses
+from asyncio import gather
+from base64 import b64encode
+from hashlib import md5
+from json import dumps, loads
+from os.path import dirname, join
+from shutil import copyfile
+from types import SimpleNamespace
+from unittest.mock import patch
 from pytest import raises
 
 # noinspection PyUnresolvedReferences
-from tests.fixtures import fiscal_package, invalid_fiscal_package
-from gobble.config import ROOT_DIR
-from gobble.fiscal import compute_hash
+from tests.fixtures import (fiscal_package,
+                            invalid_fiscal_package,
+                            tmp_user_dir,
+                            package_copy,
+                            dummy_user,
+                            fake_conductor)
+from datapackage.exceptions import ValidationError
+from gobble.config import ROOT_DIR, settings
+from gobble.api import run, upload_status
+from gobble.cache import ValidationCache
+from gobble.fiscal import compute_hash, FiscalDataPackage, UploadError
+from gobble.validation import ErrorBudget, ErrorBudgetExceeded
 
 
 DATA_FILE = join(ROOT_DIR, 'assets', 'datapackage', 'data', 'data.csv')
+PACKAGE_FILE = join(ROOT_DIR, 'assets', 'datapackage', 'datapackage.json')
+
+
+def compute_md5(body):
+    return b64encode(md5(body).digest()).decode('utf-8')
 
 
 def test_compute_hash_returns_correct_hash():
@@ -41,6 +65,199 @@ def test_validate_returns_true_for_valid_package():
     assert isinstance(report, list)
 
 
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_incremental_upload_skips_unchanged_files_only(tmp_user_dir):
+    package = FiscalDataPackage(PACKAGE_FILE, user=SimpleNamespace(id='me'))
+    previous = {'data/data.csv': 'foo', 'datapackage.json': 'spam'}
+    package._ledger.record('me', package.name, previous)
+
+    filedata = {
+        'data/data.csv': {'md5': 'foo'},
+        'data/new.csv': {'md5': 'bar'},
+        'datapackage.json': {'md5': 'spam'},
+    }
+    package._skip_unchanged_files(filedata)
+
+    assert set(filedata) == {'data/new.csv', 'datapackage.json'}
+
+
+@responses.activate
+@patch('gobble.fiscal.sleep')
+def test_poll_yields_progress_until_done(_):
+    for status, rows in (('queued', 0), ('loading-data', 50), ('done', 100)):
+        body = '{"status": "%s", "progress": %s}' % (status, rows)
+        responses.add(upload_status.method, upload_status.url, body=body)
+    package = FiscalDataPackage(PACKAGE_FILE, user=SimpleNamespace(id='me'))
+
+    events = list(package.poll())
+
+    assert [event.status for event in events] == \
+        ['queued', 'loading-data', 'done']
+    assert events[-1].total_rows == 100
+
+
+@responses.activate
+@patch('gobble.fiscal.sleep')
+def test_poll_raises_upload_error_on_failure(_):
+    body = '{"status": "fail", "progress": 0, "error": "foo"}'
+    responses.add(upload_status.method, upload_status.url, body=body)
+    package = FiscalDataPackage(PACKAGE_FILE, user=SimpleNamespace(id='me'))
+
+    with raises(UploadError):
+        list(package.poll())
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@patch('gobble.fiscal.async_sleep')
+def test_upload_async_runs_the_whole_pipeline(_, package_copy, dummy_user,
+                                              fake_conductor):
+    package = FiscalDataPackage(package_copy, user=dummy_user)
+    events = []
+
+    url = run(package.upload_async(skip_validation=True,
+                                   callback=events.append))
+
+    assert url.endswith('me:mfb2')
+    assert [event.status for event in events] == ['done']
+    assert len(package._responses) == 2
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@patch('gobble.fiscal.async_sleep')
+def test_upload_async_can_be_gathered(_, package_copy, dummy_user,
+                                      fake_conductor):
+    packages = [FiscalDataPackage(package_copy, user=dummy_user)
+                for _ in range(3)]
+
+    async def upload_all():
+        return await gather(*[package.upload_async(skip_validation=True)
+                              for package in packages])
+
+    urls = run(upload_all())
+
+    assert len(urls) == 3
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@patch('gobble.fiscal.async_sleep')
+def test_interrupted_upload_resumes_without_pushing_again(_, package_copy,
+                                                          dummy_user,
+                                                          fake_conductor):
+    package = FiscalDataPackage(package_copy, user=dummy_user)
+    insert = package._insert_into_datastore
+
+    with patch.object(package, '_insert_into_datastore',
+                      side_effect=ConnectionError):
+        with raises(ConnectionError):
+            run(package.upload_async(skip_validation=True))
+
+    with patch.object(package, '_insert_into_datastore',
+                      side_effect=insert) as retried_insert:
+        url = run(package.upload_async(skip_validation=True))
+
+    puts = [call for call in fake_conductor.calls
+            if call.request.method == 'PUT']
+    assert url.endswith('me:mfb2')
+    assert len(puts) == 2
+    assert retried_insert.call_count == 1
+    assert package._journal == {}
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_validate_data_reports_every_invalid_resource(package_copy):
+    with io.open(package_copy) as file:
+        descriptor = loads(file.read())
+    other = dict(descriptor['resources'][0], name='other', path='other.csv')
+    descriptor['resources'].append(other)
+    with io.open(package_copy, 'w') as file:
+        file.write(dumps(descriptor))
+    copyfile(DATA_FILE, join(dirname(package_copy), 'other.csv'))
+
+    package = FiscalDataPackage(package_copy)
+    meta = {'row_count': 3, 'bad_row_count': 1,
+            'bad_column_count': 1, 'columns': []}
+    outcomes = [(True, {'meta': meta, 'results': []}),
+                (False, {'meta': meta, 'results': []})]
+
+    with patch('gobble.fiscal.validate_resources', return_value=outcomes):
+        with patch('gobble.fiscal.REPORT_FILENAME',
+                   join(settings.USER_DIR, 'report.json')):
+            messages = package._validate_data(raise_on_error=False)
+            with raises(ValidationError):
+                package._validate_data(raise_on_error=True)
+
+    assert len(messages) == 3
+    assert 'other.csv' in messages[0]
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_validation_outcomes_are_cached_until_the_data_changes(package_copy):
+    meta = {'row_count': 3, 'bad_row_count': 0,
+            'bad_column_count': 0, 'columns': []}
+    outcome = [(True, {'meta': meta, 'results': []})]
+    data_file = join(dirname(package_copy), 'data', 'data.csv')
+
+    def validate():
+        package = FiscalDataPackage(package_copy)
+        with patch('gobble.validation.ProfileValidator.validate') as profile:
+            package.validate(schema_only=False)
+        return profile.call_count
+
+    with patch('gobble.fiscal.validate_resources',
+               return_value=outcome) as validator:
+        assert validate() == 1
+        assert validate() == 0
+        assert validator.call_count == 1
+
+        with io.open(data_file, 'a') as file:
+            file.write('\n')
+        assert validate() == 0
+        assert validator.call_count == 2
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_upload_aborts_when_the_error_budget_is_exceeded(package_copy,
+                                                         dummy_user,
+                                                         fake_conductor):
+    meta = {'row_count': 100, 'bad_row_count': 11, 'bad_column_count': 1,
+            'columns': [], 'truncated': True}
+    outcome = [(False, {'meta': meta, 'results': []})]
+    package = FiscalDataPackage(package_copy, user=dummy_user)
+    budget = ErrorBudget(max_bad_rows=10)
+
+    with patch('gobble.fiscal.validate_resources',
+               return_value=outcome) as validator:
+        with patch('gobble.validation.ProfileValidator.validate'):
+            with raises(ErrorBudgetExceeded):
+                package.upload(error_budget=budget)
+
+    assert validator.call_args[1]['budget'] is budget
+    assert not fake_conductor.calls
+    assert list(ValidationCache().values()) == [True]
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@patch('gobble.fiscal.async_sleep')
+def test_compressed_upload_announces_the_gzipped_files(_, package_copy,
+                                                       dummy_user,
+                                                       fake_conductor):
+    package = FiscalDataPackage(package_copy, user=dummy_user)
+
+    run(package.upload_async(skip_validation=True, compress=True))
+
+    requested = loads(fake_conductor.calls[0].request.body)['filedata']
+    puts = {call.request.url.split('?')[0].split('/')[-1]: call.request
+            for call in fake_conductor.calls if call.request.method == 'PUT'}
+    data, descriptor = puts['data.csv'], puts['datapackage.json']
+
+    assert data.headers['Content-Encoding'] == 'gzip'
+    assert int(data.headers['Content-Length']) == len(data.body)
+    assert requested['data/data.csv']['length'] == len(data.body)
+    assert requested['data/data.csv']['md5'] == compute_md5(data.body)
+    assert gzip.decompress(data.body).startswith(b'Ciclo,')
+    assert 'Content-Encoding' not in descriptor.headers
+
+
 # def test_report_validation_errors_logs_error_messages(capsys):
 #     bad_package = DataPackage({'foo': 'bar'})
 #     report_validation_errors(bad_package)
@@ -51,3 +268,67 @@ def test_validate_returns_true_for_valid_package():
 #     if settings.CONSOLE_LOG_LEVEL <= INFO:
 #         assert 'validating' in stdout
 #         assert 'required property' in stdout
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@patch('gobble.fiscal.async_sleep')
+def test_pipelined_upload_pushes_each_file_once_valid(_, package_copy,
+                                                      dummy_user,
+                                                      fake_conductor):
+    meta = {'row_count': 3, 'bad_row_count': 0,
+            'bad_column_count': 0, 'columns': []}
+    outcome = [(True, {'meta': meta, 'results': []})]
+    package = FiscalDataPackage(package_copy, user=dummy_user)
+
+    with patch('gobble.fiscal.validate_resources',
+               return_value=outcome) as validator:
+        with patch('gobble.validation.ProfileValidator.validate'):
+            url = package.upload(pipelined=True)
+
+    puts = [call for call in fake_conductor.calls
+            if call.request.method == 'PUT']
+    assert url.endswith('me:mfb2')
+    assert validator.call_count == 1
+    assert len(puts) == 2
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_pipelined_upload_cancels_transfers_of_an_invalid_package(
+        package_copy, dummy_user, fake_conductor):
+    meta = {'row_count': 3, 'bad_row_count': 1,
+            'bad_column_count': 1, 'columns': []}
+    outcome = [(False, {'meta': meta, 'results': []})]
+    package = FiscalDataPackage(package_copy, user=dummy_user)
+
+    with patch('gobble.fiscal.validate_resources', return_value=outcome):
+        with patch('gobble.validation.ProfileValidator.validate'):
+            with patch.object(package, '_insert_into_datastore') as insert:
+                with raises(ValidationError):
+                    package.upload(pipelined=True)
+
+    urls = [call.request.url for call in fake_conductor.calls]
+    assert package._cancelled.is_set()
+    assert not any('data.csv' in url for url in urls)
+    assert not insert.called
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_validate_stops_at_a_model_which_does_not_match_the_header(
+        package_copy):
+    data_file = join(dirname(package_copy), 'data', 'data.csv')
+    with io.open(data_file) as file:
+        content = file.read()
+    with io.open(data_file, 'w') as file:
+        file.write(content.replace('Aprobado', 'Approved', 1))
+    package = FiscalDataPackage(package_copy)
+
+    with patch('gobble.fiscal.validate_resources') as validator:
+        with patch('gobble.validation.ProfileValidator.validate'):
+            messages = package.validate(raise_on_error=False,
+                                        schema_only=False)
+            with raises(ValidationError):
+                package.validate(schema_only=False)
+
+    assert len(messages) == 3
+    assert all('MODEL ERROR' in message for message in messages[:2])
+    assert not validator.called
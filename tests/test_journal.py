@@ -0,0 +1,56 @@
+"""Test the journal module"""
+from os.path import exists
+
+# noinspection PyUnresolvedReferences
+from tests.fixtures import tmp_user_dir
+from gobble.journal import Journal
+
+
+FILEDATA = {
+    'datapackage.json': {'md5': 'abc'},
+    'data/data.csv': {'md5': 'def'},
+}
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_journal_starts_at_the_first_phase(tmp_user_dir):
+    journal = Journal('me', 'mfb2')
+    journal.begin(FILEDATA)
+    assert journal['phase'] == 'pushing'
+    assert journal['pushed'] == {}
+    assert not journal.has_reached('pushed')
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_journal_resumes_when_files_are_unchanged(tmp_user_dir):
+    journal = Journal('me', 'mfb2')
+    journal.begin(FILEDATA)
+    journal.record_push('data/data.csv')
+    journal.advance('pushed')
+
+    resumed = Journal('me', 'mfb2')
+    resumed.begin(FILEDATA)
+    assert resumed.has_reached('pushed')
+    assert not resumed.has_reached('inserted')
+    assert resumed['pushed'] == {'data/data.csv': 'def'}
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_journal_starts_afresh_when_a_file_changed(tmp_user_dir):
+    journal = Journal('me', 'mfb2')
+    journal.begin(FILEDATA)
+    journal.record_push('data/data.csv')
+
+    changed = dict(FILEDATA, **{'data/data.csv': {'md5': 'xyz'}})
+    resumed = Journal('me', 'mfb2')
+    resumed.begin(changed)
+    assert resumed['pushed'] == {}
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_journal_is_deleted_on_close(tmp_user_dir):
+    journal = Journal('me', 'mfb2')
+    journal.begin(FILEDATA)
+    journal.close()
+    assert not exists(journal.filepath)
+    assert Journal('me', 'mfb2') == {}
@@ -0,0 +1,40 @@
+"""Test the progress module"""
+from os.path import join
+from unittest.mock import patch
+
+from gobble.config import ROOT_DIR, settings
+from gobble.progress import Poller, estimate_rows
+
+
+DATA_FILE = join(ROOT_DIR, 'assets', 'datapackage', 'data', 'data.csv')
+
+
+def test_estimate_rows_is_exact_for_small_files():
+    assert estimate_rows(DATA_FILE) == 100
+
+
+@patch.object(settings, 'POLL_MIN_PERIOD', 1)
+@patch.object(settings, 'POLL_MAX_PERIOD', 10)
+@patch.object(settings, 'POLL_BACKOFF', 2)
+def test_poller_backs_off_exponentially_up_to_a_ceiling():
+    poller = Poller()
+    delays = [poller.next_delay() for _ in range(6)]
+    assert delays == [1, 2, 4, 8, 10, 10]
+
+
+def test_poller_computes_rate_and_eta():
+    poller = Poller(total_rows=300)
+    poller.start -= 10
+
+    progress = poller.progress({'status': 'loading-data', 'progress': 100})
+
+    assert progress.status == 'loading-data'
+    assert round(progress.rate) == 10
+    assert round(progress.eta) == 20
+
+
+def test_poller_has_no_rate_before_any_rows_are_loaded():
+    progress = Poller(total_rows=300).progress({'status': 'queued'})
+    assert progress.rows == 0
+    assert progress.rate is None
+    assert progress.eta is None
@@ -0,0 +1,61 @@
+"""Test the report module"""
+import io
+from json import loads
+from os.path import join
+
+# noinspection PyUnresolvedReferences
+from tests.fixtures import tmp_user_dir
+from gobble.config import settings
+from gobble.report import ReportWriter
+
+
+def _report(rows, bad_rows, results):
+    return {
+        'meta': {'row_count': rows,
+                 'bad_row_count': bad_rows,
+                 'bad_column_count': 1,
+                 'columns': [{'index': 0}, {'index': 1}]},
+        'results': results,
+    }
+
+
+def _error(kind, row):
+    return {'result_id': kind, 'row_index': row}
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_report_writer_caps_each_error_type(tmp_user_dir):
+    filepath = join(settings.USER_DIR, 'report.jsonl')
+    casts = [_error('schema_003', row) for row in range(5)]
+    duplicate = [_error('structure_004', 9)]
+
+    with ReportWriter(filepath, max_per_type=2) as writer:
+        writer.write('a.csv', False, _report(10, 6, casts + duplicate))
+        writer.write('b.csv', True, _report(4, 0, []))
+
+    with io.open(filepath) as file:
+        lines = [loads(line) for line in file]
+    results = [line for line in lines if line['type'] == 'result']
+    summaries = {line['path']: line for line in lines
+                 if line['type'] == 'summary'}
+
+    assert [result['row_index'] for result in results] == [0, 1, 9]
+    assert all(result['path'] == 'a.csv' for result in results)
+    assert summaries['a.csv']['errors'] == {'schema_003': 5,
+                                            'structure_004': 1}
+    assert summaries['a.csv']['omitted'] == {'schema_003': 3}
+    assert summaries['b.csv']['valid']
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_report_writer_adds_up_chunk_counts(tmp_user_dir):
+    filepath = join(settings.USER_DIR, 'report.jsonl')
+
+    with ReportWriter(filepath) as writer:
+        writer.write('a.csv', True, _report(10, 0, []))
+        tally = writer.write('a.csv', False, _report(5, 2, []))
+
+    assert not tally.valid
+    assert tally.row_count == 15
+    assert tally.bad_row_count == 2
+    assert tally.column_count == 2
@@ -0,0 +1,250 @@
+"""Test the s3 module against a fake S3 bucket"""
+import gzip
+import io
+from base64 import b64encode
+from hashlib import md5
+from os.path import join
+from threading import Event, Lock
+from time import sleep
+from unittest.mock import patch
+
+import responses
+from pytest import raises
+from requests import HTTPError
+
+# noinspection PyUnresolvedReferences
+from tests.fixtures import tmp_user_dir
+from gobble.compression import describe_compressed
+from gobble.config import settings
+from gobble.s3 import (CancellableStream,
+                       MultipartUpload,
+                       TransferCancelled,
+                       TransferScheduler,
+                       needs_multipart)
+
+
+OBJECT_URL = 'http://fakes3/fake-bucket/owner/package/data.csv'
+INITIATED = (
+    '<InitiateMultipartUploadResult>'
+    '<UploadId>spam</UploadId>'
+    '</InitiateMultipartUploadResult>'
+)
+
+
+class FakeBucket(object):
+    """A minimal S3 stand-in that understands multipart uploads"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.parts = {}
+        self.completed = None
+        self.aborted = False
+
+    def post(self, request):
+        if 'uploads' in request.url:
+            return 200, {}, INITIATED
+        self.completed = request.body
+        return 200, {}, '<CompleteMultipartUploadResult/>'
+
+    def put(self, request):
+        if self.failures:
+            self.failures -= 1
+            return 500, {}, ''
+        expected = b64encode(md5(request.body).digest()).decode('utf-8')
+        assert request.headers['Content-MD5'] == expected
+        number = int(request.url.split('partNumber=')[1].split('&')[0])
+        self.parts[number] = request.body
+        return 200, {'ETag': '"%s"' % number}, ''
+
+    def delete(self, _):
+        self.aborted = True
+        return 204, {}, ''
+
+    def register(self):
+        for method in ('post', 'put', 'delete'):
+            responses.add_callback(method.upper(),
+                                   OBJECT_URL,
+                                   callback=getattr(self, method))
+
+
+def _multipart_upload(content):
+    filepath = join(settings.USER_DIR, 'data.csv')
+    with io.open(filepath, 'wb') as file:
+        file.write(content)
+    headers = {'Content-Length': str(len(content)),
+               'Content-Type': 'text/csv'}
+    return MultipartUpload(OBJECT_URL, filepath, {'jwt': 'foo'}, headers)
+
+
+def test_multipart_is_disabled_without_threshold():
+    with patch.object(settings, 'S3_MULTIPART_THRESHOLD', None):
+        assert not needs_multipart(10 ** 12)
+    with patch.object(settings, 'S3_MULTIPART_THRESHOLD', 10):
+        assert needs_multipart(11)
+        assert not needs_multipart(10)
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+@patch.object(settings, 'S3_PART_SIZE', 10)
+def test_multipart_upload_sends_all_parts(tmp_user_dir):
+    bucket = FakeBucket()
+    bucket.register()
+    content = b'0123456789' * 4 + b'abc'
+
+    response = _multipart_upload(content)()
+
+    assert response.status_code == 200
+    assert b''.join(bucket.parts[n] for n in sorted(bucket.parts)) == content
+    assert bucket.completed.count('<Part>') == 5
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+@patch.object(settings, 'S3_PART_SIZE', 10)
+@patch.object(settings, 'S3_PART_WORKERS', 1)
+def test_multipart_upload_retries_failed_parts(tmp_user_dir):
+    bucket = FakeBucket(failures=2)
+    bucket.register()
+
+    _multipart_upload(b'0123456789' * 3)()
+
+    assert len(bucket.parts) == 3
+    assert not bucket.aborted
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+@patch.object(settings, 'S3_PART_SIZE', 10)
+@patch.object(settings, 'S3_PART_RETRIES', 1)
+def test_multipart_upload_aborts_after_too_many_failures(tmp_user_dir):
+    bucket = FakeBucket(failures=100)
+    bucket.register()
+
+    with raises(HTTPError):
+        _multipart_upload(b'0123456789' * 3)()
+    assert bucket.aborted
+
+
+class BusyBucket(object):
+    """A S3 stand-in that records how many PUT requests overlap"""
+
+    def __init__(self):
+        self.current = 0
+        self.highest = 0
+        self._lock = Lock()
+
+    def put(self, _):
+        with self._lock:
+            self.current += 1
+            self.highest = max(self.highest, self.current)
+        sleep(0.02)
+        with self._lock:
+            self.current -= 1
+        return 200, {}, ''
+
+
+def _schedule(scheduler, files):
+    futures = []
+    for i in range(files):
+        filepath = join(settings.USER_DIR, '%s.csv' % i)
+        with io.open(filepath, 'wb') as file:
+            file.write(b'0123456789')
+        headers = {'Content-Length': '10'}
+        futures.append(scheduler.submit(OBJECT_URL, filepath, {}, headers))
+    return [future.result() for future in futures]
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+def test_scheduler_limits_concurrent_transfers(tmp_user_dir):
+    bucket = BusyBucket()
+    responses.add_callback('PUT', OBJECT_URL, callback=bucket.put)
+
+    results = _schedule(TransferScheduler(max_transfers=2), 6)
+
+    assert all(response.status_code == 200 for response in results)
+    assert bucket.highest == 2
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+def test_scheduler_limits_bytes_in_flight(tmp_user_dir):
+    bucket = BusyBucket()
+    responses.add_callback('PUT', OBJECT_URL, callback=bucket.put)
+    scheduler = TransferScheduler(max_transfers=4, max_bytes=25)
+
+    _schedule(scheduler, 6)
+
+    assert bucket.highest == 2
+    assert scheduler.inflight_bytes == 0
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+def test_scheduler_closes_files_on_error(tmp_user_dir):
+    responses.add('PUT', OBJECT_URL, body=IOError('connection reset'))
+    streams = []
+    open_ = io.open
+
+    def spy(*args, **kwargs):
+        streams.append(open_(*args, **kwargs))
+        return streams[-1]
+
+    with patch('gobble.s3.io.open', side_effect=spy):
+        with raises(IOError):
+            _schedule(TransferScheduler(), 1)
+
+    assert streams and all(stream.closed for stream in streams)
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+def test_scheduler_gzips_files_with_a_gzip_content_encoding(tmp_user_dir):
+    bodies = []
+
+    def put(request):
+        bodies.append(request.body)
+        return 200, {}, ''
+
+    responses.add_callback('PUT', OBJECT_URL, callback=put)
+    filepath = join(settings.USER_DIR, 'data.csv')
+    with io.open(filepath, 'wb') as file:
+        file.write(b'0123456789' * 100)
+    description = describe_compressed(filepath)
+    headers = {'Content-Length': str(description['length']),
+               'Content-Encoding': 'gzip'}
+
+    TransferScheduler().submit(OBJECT_URL, filepath, {}, headers).result()
+
+    assert len(bodies[0]) == description['length']
+    assert gzip.decompress(bodies[0]) == b'0123456789' * 100
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+@responses.activate
+def test_scheduler_skips_cancelled_transfers(tmp_user_dir):
+    filepath = join(settings.USER_DIR, 'data.csv')
+    with io.open(filepath, 'wb') as file:
+        file.write(b'0123456789')
+    cancelled = Event()
+    cancelled.set()
+
+    future = TransferScheduler().submit(OBJECT_URL, filepath, {},
+                                        {'Content-Length': '10'},
+                                        cancelled=cancelled)
+
+    with raises(TransferCancelled):
+        future.result()
+    assert not responses.calls
+
+
+def test_cancellable_stream_stops_half_way():
+    cancelled = Event()
+    stream = CancellableStream(io.BytesIO(b'0123456789'), 10, cancelled)
+
+    assert len(stream) == 10
+    assert stream.read(4) == b'0123'
+    cancelled.set()
+    with raises(TransferCancelled):
+        stream.read(4)
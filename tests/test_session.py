@@ -0,0 +1,75 @@
+"""Test the session module against a local HTTP server"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+
+from pytest import fixture
+import responses
+
+from gobble.api import EndPoint
+from gobble.session import (PooledAdapter,
+                            connection_stats,
+                            get_session,
+                            make_session)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+@fixture
+def local_server():
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%s/' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+# noinspection PyShadowingNames
+def test_session_reuses_connections(local_server):
+    session = make_session()
+    for _ in range(3):
+        session.get(local_server)
+
+    assert connection_stats(session) == {'requests': 3,
+                                         'connections': 1,
+                                         'reused': 2}
+
+
+# noinspection PyShadowingNames
+def test_session_without_keep_alive_opens_a_connection_per_request(
+        local_server):
+    session = make_session(keep_alive=False)
+    for _ in range(3):
+        session.get(local_server)
+
+    assert connection_stats(session)['connections'] == 3
+
+
+def test_session_is_configured_from_settings():
+    adapter = make_session(pool_size=5, timeout=(1, 2)).adapters['https://']
+
+    assert isinstance(adapter, PooledAdapter)
+    assert adapter._pool_maxsize == 5
+    assert adapter.timeout == (1, 2)
+
+
+@responses.activate
+def test_endpoints_share_one_session():
+    responses.add('GET', 'http://dev.openspending.org/user/check')
+    endpoint = EndPoint('GET', 'user', 'check')
+
+    response = endpoint()
+
+    assert endpoint.fire.__self__ is get_session()
+    assert response.status_code == 200
@@ -0,0 +1,213 @@
+"""Test the validation module"""
+import io
+from os.path import join
+from json import loads
+from unittest.mock import patch
+
+from datapackage.exceptions import ValidationError
+from pytest import raises
+
+# noinspection PyUnresolvedReferences
+from tests.fixtures import tmp_user_dir
+from gobble.config import ROOT_DIR, settings
+from gobble.validation import (ErrorBudget,
+                               check_model,
+                               read_header,
+                               merge_reports,
+                               sample_rows,
+                               merge_chunks,
+                               get_validator,
+                               validate_descriptors,
+                               split_rows,
+                               chunk_size_for)
+
+
+DATA_FILE = join(ROOT_DIR, 'assets', 'datapackage', 'data', 'data.csv')
+PACKAGE_FILE = join(ROOT_DIR, 'assets', 'datapackage', 'datapackage.json')
+
+
+def _report(rows, bad_rows, results):
+    return {
+        'meta': {'row_count': rows,
+                 'bad_row_count': bad_rows,
+                 'bad_column_count': 1 if bad_rows else 0,
+                 'columns': []},
+        'results': results,
+    }
+
+
+def test_merge_reports_adds_up_counts_and_tags_results():
+    error = {'result_id': 'schema_003', 'row_index': 4}
+    merged = merge_reports({
+        'a.csv': _report(10, 0, []),
+        'b.csv': _report(20, 2, [error, error]),
+    })
+
+    assert merged['meta']['row_count'] == 30
+    assert merged['meta']['bad_row_count'] == 2
+    assert merged['meta']['bad_column_count'] == 1
+    assert set(merged['meta']['resources']) == {'a.csv', 'b.csv'}
+    assert [result['path'] for result in merged['results']] == ['b.csv'] * 2
+    assert 'path' not in error
+
+
+def test_split_rows_cuts_on_row_boundaries():
+    with io.open(DATA_FILE, 'rb') as file:
+        content = file.read()
+
+    header_end, chunks = split_rows(DATA_FILE, chunk_size=5000)
+
+    assert content[header_end - 1:header_end] == b'\n'
+    assert chunks[0][0] == header_end
+    assert chunks[-1][1] == len(content)
+    pairs = zip(chunks, chunks[1:])
+    assert all(end == start for (_, end), (start, _) in pairs)
+    assert all(content[end - 1:end] == b'\n' for _, end in chunks)
+    rows = sum(content[start:end].count(b'\n') for start, end in chunks)
+    assert rows == content.count(b'\n') - 1
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_chunk_size_stays_under_the_row_limit(tmp_user_dir):
+    filepath = join(settings.USER_DIR, 'narrow.csv')
+    with io.open(filepath, 'wb') as file:
+        file.write(b'a,b\n' + b'1,2\n' * 10000)
+
+    with patch.object(settings, 'VALIDATION_CHUNK_SIZE', 10 ** 9):
+        assert chunk_size_for(filepath) == 4 * 15000
+    with patch.object(settings, 'VALIDATION_CHUNK_SIZE', 1000):
+        assert chunk_size_for(filepath) == 1000
+
+
+def test_merge_chunks_rebases_row_indexes():
+    header = {'result_category': 'header', 'result_level': 'error',
+              'row_index': None, 'column_index': 0}
+    bad_cell = {'result_category': 'row', 'result_level': 'error',
+                'row_index': 3, 'column_index': 2}
+    chunk = _report(10, 1, [header, bad_cell])
+
+    valid, report = merge_chunks([(False, chunk), (True, _report(5, 0, [])),
+                                  (False, chunk)])
+
+    assert not valid
+    assert report['meta']['row_count'] == 25
+    assert report['meta']['bad_row_count'] == 2
+    assert report['meta']['bad_column_count'] == 1
+    assert report['meta']['chunks'] == 3
+    assert [result['row_index'] for result in report['results']] == \
+        [None, 3, 18]
+
+
+def test_profile_validator_is_compiled_once_per_process():
+    assert get_validator() is get_validator()
+
+
+def test_validate_descriptors_returns_structured_errors():
+    with io.open(PACKAGE_FILE) as file:
+        descriptor = loads(file.read())
+    broken = dict(descriptor, name=42)
+
+    good, bad = validate_descriptors([descriptor, broken])
+
+    assert not any(error['path'] == 'name' for error in good)
+    error = next(error for error in bad if error['path'] == 'name')
+    assert 'is not of type' in error['message']
+    assert error['profile_path']
+
+
+def test_profile_validator_raises_with_one_error_per_problem():
+    with raises(ValidationError) as error:
+        get_validator().validate({'name': 42})
+    assert len(error.value.errors) == len(get_validator().errors({'name': 42}))
+
+
+def _numbered_file(rows):
+    filepath = join(settings.USER_DIR, 'numbers.csv')
+    with io.open(filepath, 'wb') as file:
+        file.write(b'number\n')
+        for number in range(rows):
+            file.write(b'%05d\n' % number)
+    return filepath
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_sample_rows_picks_whole_rows(tmp_user_dir):
+    filepath = _numbered_file(10000)
+
+    header, rows = sample_rows(filepath, 50, strategy='random', seed=1)
+
+    assert header == b'number\n'
+    assert 0 < len(rows) <= 50
+    with io.open(filepath, 'rb') as file:
+        content = file.read()
+    for offset, row in rows:
+        assert content[offset - 1:offset] == b'\n'
+        assert content[offset:offset + len(row)] == row
+
+
+# noinspection PyShadowingNames,PyUnusedLocal
+def test_stratified_sample_covers_the_whole_file(tmp_user_dir):
+    filepath = _numbered_file(10000)
+
+    _, rows = sample_rows(filepath, 10, strategy='stratified', seed=1)
+
+    numbers = [int(row) for _, row in rows]
+    assert len(numbers) == 10
+    assert [number // 1000 for number in numbers] == list(range(10))
+
+
+def _error(row, column):
+    return {'result_category': 'row', 'result_level': 'error',
+            'row_index': row, 'column_index': column}
+
+
+def test_error_budget_limits_bad_rows():
+    budget = ErrorBudget(max_bad_rows=2)
+    assert not budget.spend(_error(1, 0))
+    assert not budget.spend(_error(1, 1))
+    assert not budget.spend(_error(2, 0))
+    assert budget.spend(_error(3, 0))
+    assert not budget.renew().exceeded
+
+
+def test_error_budget_limits_errors_per_column():
+    budget = ErrorBudget(max_column_errors=1)
+    assert not budget.spend(_error(1, 0))
+    assert not budget.spend(_error(2, 1))
+    assert budget.spend(_error(3, 0))
+
+
+def test_merge_chunks_stops_when_the_budget_is_exceeded():
+    chunks = [(False, _report(10, 2, [_error(0, 0), _error(1, 0)]))] * 3
+
+    valid, report = merge_chunks(iter(chunks), ErrorBudget(max_bad_rows=3))
+
+    assert not valid
+    assert report['meta']['truncated']
+    assert report['meta']['chunks'] == 2
+    assert report['meta']['row_count'] == 20
+
+
+def test_read_header_returns_the_first_row():
+    header = read_header(DATA_FILE)
+
+    assert header[:2] == ['Ciclo', 'ID_Ramo']
+    assert 'ID_TG' in header
+
+
+def test_check_model_reports_columns_missing_from_fields_or_headers():
+    model = {
+        'measures': {'amount': {'source': 'Amount'}},
+        'dimensions': {
+            'date': {'attributes': {'year': {'source': 'Year'}}},
+            'item': {'attributes': {'code': {'source': 'Code'}}},
+        },
+    }
+    schema = {'fields': [{'name': 'Amount'}, {'name': 'Year'}]}
+
+    errors = check_model(model, [('data.csv', ['Amount', 'Extra'], schema)])
+
+    assert len(errors) == 3
+    assert '"Year" is not in the header of data.csv' in errors[0]
+    assert 'date.year' in errors[1] and 'in no header' in errors[1]
+    assert 'item.code' in errors[2] and 'not a field' in errors[2]
@@ -0,0 +1,54 @@
+"""Test the vectorized module"""
+from pytest import importorskip
+
+from gobble.vectorized import supports, flag_rows
+
+numpy = importorskip('numpy')
+
+
+SCHEMA = {'fields': [
+    {'name': 'id', 'type': 'integer'},
+    {'name': 'date', 'type': 'date', 'constraints': {'required': True}},
+    {'name': 'amount', 'type': 'number', 'format': 'default',
+     'groupChar': ',', 'decimalChar': '.'},
+    {'name': 'label', 'type': 'string'},
+]}
+
+
+def test_supports_only_default_formats_and_required_constraints():
+    assert supports(SCHEMA)
+    assert not supports({'fields': [{'name': 'a', 'type': 'boolean'}]})
+    assert not supports({'fields': [{'name': 'a', 'type': 'number',
+                                     'decimalChar': ','}]})
+    assert not supports({'fields': [{'name': 'a', 'type': 'date',
+                                     'format': 'fmt:%d/%m/%Y'}]})
+    assert not supports({'fields': [{'name': 'a',
+                                     'constraints': {'unique': True}}]})
+
+
+def test_flag_rows_flags_bad_values_only():
+    text = ('id,date,amount,label\n'
+            '1,2016-02-29,"1,000.5",a\n'
+            'x,2015-01-01,2,b\n'
+            '3,,3,c\n'
+            '4,2015-02-29,4,d\n'
+            '5,2015-01-05,-.5,\n'
+            '6,0000-01-01,NaN,f\n'
+            '7,2015-01-07,1e3,g\n')
+    headers, row_count, rows = flag_rows(text, SCHEMA, block_rows=3)
+
+    assert headers == ['id', 'date', 'amount', 'label']
+    assert row_count == 7
+    assert [index for index, _ in rows] == [1, 2, 3, 5, 6]
+    assert rows[0] == (1, ['x', '2015-01-01', '2', 'b'])
+
+
+def test_flag_rows_flags_structural_problems():
+    text = ('id,date,amount,label\n'
+            '1,2015-01-01,1,a\n'
+            '2,2015-01-02,2\n'
+            ',,,\n'
+            '1,2015-01-01,1,a\n')
+    _, _, rows = flag_rows(text, SCHEMA, block_rows=2)
+
+    assert [index for index, _ in rows] == [0, 1, 2, 3]